@@ -1,15 +1,33 @@
 import streamlit as st
 from PIL import Image
 import io
+import time
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-# Import custom components
-from component.gemini_client import get_gemini_client, process_uploaded_pdfs
-from component.visualizer import render_crystal
-from component.physics_engine import analyze_structure 
-from component.simulator import generate_xrd_plot 
+# Import custom components (light ones eagerly; pymatgen, matplotlib, genai and stmol load on first use)
+from component.lazy import lazy_module, start_warmup, warm_structure_stack
 from component.reporter import generate_markdown_report
 from component.styles import apply_custom_css
-from component.mp_client import get_mp_reference
+from component.discovery import MODEL_NAME, PHASE_ID_PROMPT, band_gap_prompt, closed_cif, extract_cif, extract_cifs
+from component.response_cache import cache_responses
+from component.pipeline import Stage, from_future, prestart, run_pipeline
+from component.run_history import get_run_history, new_run_id
+from component.tracing import get_tracer, start_trace
+from component.workspace import (
+    create_workspace, current_workspace_id, open_run, render_performance_panel, render_phase_panel, render_report_download, render_saved_run,
+    render_structure_panel, render_stage_failure, render_synthesis_command, render_xrd_match
+)
+
+gemini = lazy_module("component.gemini_client")
+physics = lazy_module("component.physics_engine")
+simulator = lazy_module("component.simulator")
+digitizer = lazy_module("component.digitizer")
+mp_client = lazy_module("component.mp_client")
+image_prep = lazy_module("component.image_prep")
+phase_analysis = lazy_module("component.phases")
+phase_search = lazy_module("component.phase_search")
+literature = lazy_module("component.literature_index")
 
 # 1. Page Configuration
 st.set_page_config(
@@ -18,10 +36,12 @@ st.set_page_config(
     page_icon="⚛️"
 )
 
-# 2. Initialize Client
-client = get_gemini_client()
+# 2. Client: one per server process, created on first use so the SDK import stays off the first paint
+@st.cache_resource(show_spinner=False)
+def load_client():
+    return cache_responses(gemini.get_gemini_client())
 
-if client:
+if gemini.has_api_key():
     apply_custom_css()
     
     # --- HEADER SECTION ---
@@ -93,102 +113,249 @@ if client:
                     "Select Material System", 
                     ["Oxide", "Perovskite", "Metal/Alloy", "2D Material", "Unknown"]
                 )
+                # Tick labels aren't read from the image, so the calibration has to come from the user
+                tick_c1, tick_c2 = st.columns(2)
+                first_tick = tick_c1.number_input("First 2θ tick", value=None, step=5.0, placeholder="e.g. 10")
+                last_tick = tick_c2.number_input("Last 2θ tick", value=None, step=5.0, placeholder="e.g. 70")
                 run_btn = st.button("EXECUTE DISCOVERY RUN", width='stretch', type="primary")
 
         if uploaded_files:
             st.divider()
             with st.expander("📂 Experimental Data Preview", expanded=True):
                 img_cols = st.columns(len(uploaded_files))
-                images_for_gemini = []
+                prepared_images = []
+                experimental_peaks = []
+                experimental_curves = []
                 for idx, file in enumerate(uploaded_files):
                     img = Image.open(file)
-                    images_for_gemini.append(img)
+                    # The model gets a downscaled, re-encoded copy; the preview keeps the original
+                    prepared = image_prep.preprocess_image(file.getvalue(), file.name)
+                    prepared_images.append(prepared)
                     img_cols[idx].image(img, caption=file.name, width='stretch')
+                    if prepared["kind"] == "xrd" and (first_tick is None or last_tick is None or first_tick >= last_tick):
+                        img_cols[idx].caption("📍 Enter the first and last 2θ tick labels of this plot to read its peaks.")
+                    elif prepared["kind"] == "xrd":
+                        # Peaks are read off the plot locally so the simulated pattern can be checked without the model
+                        digitized = digitizer.digitize_xrd(file.getvalue(), tick_range=(first_tick, last_tick))
+                        for curve in digitized["curves"]:
+                            experimental_peaks.append((
+                                f"{file.name} ({curve['label']})", curve["peaks"],
+                                (float(curve["two_theta"].min()), float(curve["two_theta"].max()))
+                            ))
+                            experimental_curves.append((curve["two_theta"], curve["intensity"]))
+                            img_cols[idx].caption(
+                                f"📍 {curve['label']} trace: peaks at "
+                                + ", ".join(f"{x:.1f}°" for x in curve["peaks"]["two_theta"])
+                            )
+                savings = image_prep.payload_savings(prepared_images)
+                st.caption(
+                    f"🗜️ Model payload: {savings['original_bytes'] / 1e6:.2f} MB → {savings['bytes'] / 1e6:.2f} MB "
+                    f"({savings['saved_bytes'] / max(savings['original_bytes'], 1):.0%} saved)"
+                )
             
             if run_btn:
+                client = load_client()
+                run_id = start_trace(new_run_id())
+                st.markdown("### 📝 Multimodal Research Report")
+                report_slot = st.empty()
+                early = {}
+
+                def render_partial_report(text):
+                    report_slot.markdown(text + " ▌")
+                    # Start the CIF-only work as soon as the CIF block closes, while the prose keeps streaming
+                    if not early:
+                        cif = closed_cif(text)
+                        if cif:
+                            early.update(cif=cif, analysis=prestart(physics.analyze_structure, cif), xrd=prestart(simulator.simulate_xrd_pattern, cif))
+
                 with st.spinner("Synthesizing Multimodal Data & Predicting Properties..."):
-                    prompt = f"ACT AS: A Senior Characterization Scientist. Analyze these images. 1. Identify Phase. 2. Describe Morphology. 3. Correlate XRD/SEM. Provide a valid .CIF block starting with 'data_'."
-                    response = client.models.generate_content(model="gemini-3-flash-preview", contents=[prompt, *images_for_gemini])
-                    
-                    st.markdown("### 📝 Multimodal Research Report")
-                    st.markdown(response.text)
+                    images_for_gemini = [image_prep.to_part(p) for p in prepared_images]
+                    analysis_text = gemini.stream_text(client, MODEL_NAME, [PHASE_ID_PROMPT, *images_for_gemini], on_text=render_partial_report)
+                    report_slot.markdown(analysis_text)
+
+                    run_record = {"run_id": run_id, "material_class": material_class, "analysis_text": analysis_text}
                     
-                    if "data_" in response.text:
-                        parts = response.text.split("```")
-                        cif_data = ""
-                        for p in parts:
-                            if "data_" in p:
-                                cif_data = p.replace("cif", "").strip()
-                                break
+                    if "data_" in analysis_text:
+                        cif_data = early.get("cif") or extract_cif(analysis_text)
+                        phases = extract_cifs(analysis_text)
                         
                         if cif_data:
-                            st.divider()
-                            st.markdown("<h2 style='text-align: center; color: #00ffcc;'>📊 Integrated Discovery Workspace</h2>", unsafe_allow_html=True)
-                            results = analyze_structure(cif_data)
-
-                            # --- TOP ROW: PRIMARY ACTIONS ---
-                            with st.container(border=True):
-                                col_dl1, col_dl2, col_dl3 = st.columns([1, 1, 1])
-                                with col_dl1:
-                                    st.download_button("💾 Export Structure (.CIF)", data=cif_data, file_name="predicted.cif", width='stretch')
-                                with col_dl2:
-                                    report_md = generate_markdown_report(response.text, results, material_class)
-                                    st.download_button("📄 Download Research Brief", data=report_md, file_name="MatNexus_Report.md", width='stretch', type="primary")
-                                with col_dl3:
-                                    st.button("🔄 Clear & Re-run", width='stretch', on_click=lambda: st.rerun())
-
-                            # --- MIDDLE ROW: ANALYTICS ---
-                            res_c1, res_c2 = st.columns([1.2, 1])
-                            with res_c1:
-                                with st.container(border=True):
-                                    st.markdown("#### 📦 Structural Ground-Truth")
-                                    if "error" not in results:
-                                        mp_ref = get_mp_reference(results['formula'])
-                                        m1, m2 = st.columns(2)
-                                        m1.metric("Formula", results['formula'])
-                                        if mp_ref and "error" not in mp_ref:
-                                            m2.metric("AI Density", f"{results['density']:.2f} g/cm³", delta=f"{results['density'] - mp_ref['density']:.2f} vs MP")
-                                            st.caption(f"📍 Verified via [Materials Project: {mp_ref['mp_id']}](https://next-gen.materialsproject.org/materials/{mp_ref['mp_id']})")
-                                        
-                                        with st.expander("🔍 Extended Crystallographic Data", expanded=True):
-                                            st.write(f"**Space Group:** {results['space_group']}")
-                                            st.write(f"**Crystal System:** {results.get('crystal_system', 'N/A')}")
-                                            st.write(f"**Lattice (a,b,c):** {results['a']:.3f}, {results['b']:.3f}, {results['c']:.3f}")
-
-                            with res_c2:
-                                with st.container(border=True):
-                                    st.markdown("#### ⚛️ Quantum Property Prediction")
-                                    dft_prompt = f"Predict Band Gap (eV) and Electronic Nature for this CIF: {results['formula']}. Use a professional table format."
-                                    dft_res = client.models.generate_content(model="gemini-3-flash-preview", contents=[dft_prompt, cif_data])
-                                    st.markdown(dft_res.text)
-
-                            # --- BOTTOM ROW: VISUALS & ROBOTICS ---
-                            vis_c1, vis_c2 = st.columns(2)
-                            with vis_c1:
-                                with st.container(border=True):
-                                    st.markdown("#### 🧊 3D Unit Cell Rendering")
-                                    render_crystal(cif_data)
-                            with vis_c2:
-                                with st.container(border=True):
-                                    st.markdown("#### 📈 Predicted Powder Diffraction")
-                                    fig = generate_xrd_plot(cif_data)
-                                    if fig: st.pyplot(fig)
-
-                            # --- FOOTER: AUTONOMOUS COMMAND ---
-                            st.divider()
-                            st.markdown("### 🤖 Autonomous Synthesis Command")
-                            if mp_ref and "error" not in mp_ref and abs(results['density'] - mp_ref['density']) > 0.5:
-                                st.error(f"**System Warning:** High Lattice Discrepancy. **Correction:** Increase Sintering Time by 20% to stabilize the {results['formula']} phase.")
-                            else:
-                                st.success(f"**System Ready:** AI prediction aligns with {results['formula']} standards. Proceed to next stage.")
+                            run_record["cif"] = cif_data
+                            slots = create_workspace(cif_data, multi_phase=len(phases) > 1)
+                            for slot in (slots["structure"], slots["dft"], slots["xrd"], slots["command"]):
+                                slot.caption("⏳ Running...")
+
+                            # MP lookup, DFT-proxy prompt and XRD simulation only need the CIF
+                            # (and the formula), so they run concurrently and render as they land
+                            script_ctx = get_script_run_ctx()
+                            # Set by the pipeline on timeout, so the stream stops writing over the failure notice;
+                            # the lock keeps a chunk that is mid-write from landing after the notice
+                            dft_cancel = threading.Event()
+                            dft_lock = threading.Lock()
+
+                            def write_dft(text):
+                                with dft_lock:
+                                    if not dft_cancel.is_set():
+                                        slots["dft"].markdown(text)
+
+                            def predict_band_gap(analysis):
+                                # Stage threads need the script context to stream into the panel
+                                add_script_run_ctx(threading.current_thread(), script_ctx)
+                                dft_prompt = band_gap_prompt(analysis.get('formula', 'Unknown'))
+                                return gemini.stream_text(client, MODEL_NAME, [dft_prompt, cif_data],
+                                                          on_text=write_dft, cancel=dft_cancel)
+
+                            def lookup_reference(analysis):
+                                return None if "error" in analysis else mp_client.get_mp_reference(analysis['formula'])
+
+                            # Every phase on one axis, over the first digitized trace when there is one
+                            xrd_phases = [(p["name"], p["cif"]) for p in phases] or cif_data
+                            measured = experimental_curves[0] if experimental_curves else None
+
+                            def render_pattern(cif_string):
+                                if early:
+                                    early["xrd"].result()  # the prestarted simulation fills the pattern cache
+                                return simulator.render_xrd_png(xrd_phases, experiment=measured)
+
+                            def match_experiment(cif_string):
+                                two_theta, intensity = simulator.simulate_xrd_pattern(cif_string)
+                                # Local search-match against the reference index, when one has been built
+                                index = phase_search.get_phase_index()
+                                return [(
+                                    label,
+                                    # Only simulated peaks inside the digitized 2θ span can be found in the trace
+                                    digitizer.match_peaks(peaks["two_theta"], two_theta, intensity, two_theta_range=span),
+                                    index.query(peaks["two_theta"], peaks["intensity"], top_k=3) if index else []
+                                ) for label, peaks, span in experimental_peaks]
+
+                            stages = [
+                                Stage("analysis", from_future(early["analysis"]) if early else physics.analyze_structure,
+                                      deps=["cif_string"], timeout=60),
+                                Stage("mp_ref", lookup_reference, deps=["analysis"], timeout=30),
+                                Stage("dft", predict_band_gap, deps=["analysis"], timeout=120, cancel=dft_cancel),
+                                Stage("xrd", render_pattern, deps=["cif_string"], timeout=60),
+                            ]
+                            if experimental_peaks:
+                                stages.append(Stage("xrd_match", match_experiment, deps=["cif_string"], timeout=60))
+                            if len(phases) > 1:
+                                # Every phase is analyzed in its own worker process, then merged into one view
+                                def analyze_all_phases():
+                                    results = phase_analysis.analyze_phases(phases, material_class)
+                                    return results, phase_analysis.phase_fractions(results, *(measured or (None, None)))
+
+                                stages.append(Stage("phases", analyze_all_phases, timeout=180))
+
+                            def on_stage_done(name, result):
+                                if name == "analysis":
+                                    if result.ok:
+                                        report_md = generate_markdown_report(analysis_text, result.value, material_class)
+                                        run_record.update(metrics=result.value, formula=result.value.get("formula"), report=report_md)
+                                        render_report_download(slots["report"], report_md)
+                                        with slots["structure"].container():
+                                            render_structure_panel(result.value)
+                                    else:
+                                        with slots["structure"].container():
+                                            render_stage_failure("Structure analysis", result)
+                                elif name == "mp_ref" and "metrics" in run_record:
+                                    analysis = run_record["metrics"]
+                                    mp_ref = result.value if result.ok else None
+                                    run_record["mp_ref"] = mp_ref
+                                    with slots["structure"].container():
+                                        render_structure_panel(analysis, mp_ref)
+                                    with slots["command"].container():
+                                        render_synthesis_command(analysis, mp_ref)
+                                    if result.status in ("error", "timeout"):
+                                        st.toast(f"Materials Project lookup {result.status}: {result.error}")
+                                elif name == "dft":
+                                    with dft_lock, slots["dft"].container():
+                                        if result.ok:
+                                            run_record["dft_text"] = result.value
+                                            st.markdown(result.value)
+                                        else:
+                                            render_stage_failure("Band-gap prediction", result)
+                                elif name == "xrd":
+                                    with slots["xrd"].container():
+                                        if result.ok and result.value:
+                                            run_record["xrd_png"] = result.value
+                                            st.image(result.value, width='stretch')
+                                        elif not result.ok:
+                                            render_stage_failure("XRD simulation", result)
+                                        else:
+                                            st.caption("No diffraction pattern could be simulated.")
+                                elif name == "phases":
+                                    with slots["phases"].container():
+                                        if result.ok:
+                                            phase_results, fractions = result.value
+                                            # The simulated lines are only needed for the fractions, so they aren't stored
+                                            run_record["phases"] = {
+                                                "results": [{k: v for k, v in p.items() if k != "xrd"} for p in phase_results],
+                                                "fractions": fractions
+                                            }
+                                            render_phase_panel(phase_results, fractions)
+                                        else:
+                                            render_stage_failure("Multi-phase analysis", result)
+                                elif name == "xrd_match":
+                                    with slots["xrd_match"].container():
+                                        if result.ok:
+                                            run_record["xrd_match"] = result.value
+                                            render_xrd_match(result.value)
+                                        else:
+                                            render_stage_failure("Peak matching", result)
+
+                            stage_results = run_pipeline(stages, inputs={"cif_string": cif_data}, on_complete=on_stage_done)
+                            if not stage_results["analysis"].ok:
+                                with slots["command"].container():
+                                    render_synthesis_command({"error": stage_results["analysis"].error})
+
+                    # Keep the finished run so later reruns reopen it without recomputing
+                    st.session_state["active_run"] = get_run_history().save(run_record, current_workspace_id())
+                render_performance_panel(get_tracer().summary(run_id))
+
+        if not (uploaded_files and run_btn) and st.session_state.get("active_run"):
+            saved_run = get_run_history().load(st.session_state["active_run"], current_workspace_id())
+            if saved_run:
+                render_saved_run(saved_run)
+
+    # --- SIDEBAR: RUN HISTORY ---
+    with st.sidebar:
+        st.markdown("### 🗂️ Past Discovery Runs")
+        past_runs = get_run_history().list_runs(current_workspace_id())
+        if not past_runs:
+            st.caption("No runs yet.")
+        for past in past_runs:
+            label = f"{past['formula'] or 'No structure'} · {past['material_class']} · {time.strftime('%b %d %H:%M', time.localtime(past['created_at']))}"
+            st.button(label, key=f"run_{past['run_id']}", width='stretch',
+                      on_click=open_run, args=(past['run_id'],),
+                      type="primary" if past['run_id'] == st.session_state.get("active_run") else "secondary")
 
     with tab_miner:
         st.header("📚 Research Knowledge Miner")
         pdf_files = st.file_uploader("Upload PDF Papers", type="pdf", accept_multiple_files=True)
+        question = st.text_input("Research Question", value="Summarize key properties.")
+        full_papers = st.checkbox("Send full papers instead of the top-ranked excerpts", value=False)
         if pdf_files and st.button("🚀 MINE KNOWLEDGE", width='stretch'):
-            gemini_files = process_uploaded_pdfs(client, pdf_files)
-            response = client.models.generate_content(model="gemini-3-flash-preview", contents=[*gemini_files, "Summarize key properties."])
+            client = load_client()
+            if full_papers:
+                gemini_files = gemini.process_uploaded_pdfs(client, pdf_files)
+                response = client.models.generate_content(model=MODEL_NAME, contents=[*gemini_files, question])
+            else:
+                # Papers are chunked and indexed locally once; each question only sends the best excerpts
+                index = literature.get_literature_index()
+                digests = []
+                with st.spinner("Indexing papers..."):
+                    for pdf in pdf_files:
+                        digest, _ = index.add_paper(pdf.name, pdf.getvalue(), save=False)
+                        digests.append(digest)
+                    index.save()
+                hits = index.search(question, top_k=literature.TOP_K, papers=digests)
+                st.caption(f"🔎 {len(hits)} excerpts from {len(digests)} papers ({len(index)} chunks indexed)")
+                response = client.models.generate_content(model=MODEL_NAME, contents=[literature.question_prompt(question, hits)])
+                with st.expander("📑 Excerpts sent to the model"):
+                    st.markdown(literature.build_context(hits))
             st.markdown("### 📚 Extracted Insights")
             st.markdown(response.text)
 else:
-    st.error("API Connection Failed.")
\ No newline at end of file
+    st.error("API Connection Failed.")
+
+# The page is on screen; load the heavy stack in the background before the first run needs it
+start_warmup(tasks=(warm_structure_stack,))
\ No newline at end of file
@@ -0,0 +1,309 @@
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import matplotlib
+import numpy as np
+
+matplotlib.use("Agg")
+
+from benchmarks import stubs
+from benchmarks.fixtures import (
+    SUPERCELL_SIZES, ZNO_CIF, model_response, perturbed_cifs, supercell, supercell_cif, zno_metrics
+)
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+# Used when thresholds.json has no entry for a benchmark: allowed median slowdown vs the baseline
+DEFAULT_TOLERANCE = 1.25
+
+# On-disk state the benchmarked code would otherwise create under .matnexus/ in the working directory
+STATE_PATHS = {
+    "MATNEXUS_STRUCTURE_INDEX": "structure_index.sqlite",
+    "MATNEXUS_TRACE_PATH": "traces.jsonl",
+    "MATNEXUS_RESPONSE_CACHE_DIR": "response_cache",
+    "MATNEXUS_MP_STORE": "mp_reference.sqlite",
+    "MATNEXUS_RUN_HISTORY": "runs.sqlite",
+}
+
+
+class Benchmark:
+    """
+    One timed callable. `setup()` runs untimed before every round and its return
+    value is passed to `func`; `teardown(result)` runs untimed after it.
+    """
+
+    def __init__(self, name, func, setup=None, teardown=None, rounds=5):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.teardown = teardown
+        self.rounds = rounds
+
+    def run(self, warmup=1):
+        timings = []
+        for i in range(warmup + self.rounds):
+            arg = self.setup() if self.setup else None
+            started = time.perf_counter()
+            result = self.func(arg) if self.setup else self.func()
+            elapsed = time.perf_counter() - started
+            if self.teardown:
+                self.teardown(result)
+            if i >= warmup:
+                timings.append(elapsed)
+        return {
+            "median": statistics.median(timings),
+            "min": min(timings),
+            "mean": statistics.fmean(timings),
+            "max": max(timings),
+            "rounds": len(timings)
+        }
+
+
+def _cold(cif):
+    """Setup that empties the structure cache so the CIF is parsed again in the timed call."""
+    def setup():
+        from component.structure_cache import clear_cache
+        clear_cache()
+        return cif
+    return setup
+
+
+def isolate_state(workdir=None):
+    """
+    Points every on-disk store at a scratch directory, so a benchmark run never
+    touches (or is sped up by) the .matnexus/ state of the working directory.
+    Must run before the component modules are imported; returns the directory.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="matnexus-bench-")
+    for variable, name in STATE_PATHS.items():
+        os.environ[variable] = os.path.join(workdir, name)
+    return workdir
+
+
+def physics_benchmarks(sizes):
+    from component.physics_engine import analyze_structure, validate_results
+    from component.structure_cache import StructureEntry
+
+    suite = []
+    for n in sizes:
+        # Symmetry + metrics of the full supercell; a fresh entry each round, so nothing is memoized
+        suite.append(Benchmark(f"physics.metrics[{n}x{n}x{n}]", lambda entry: entry.metrics(symprec=0.1),
+                               setup=lambda n=n: StructureEntry(None, supercell(n))))
+    # Cold: parse + index lookup + symmetry, the cost of a CIF the app has not seen yet
+    suite.append(Benchmark("physics.analyze_structure[ZnO]", analyze_structure, setup=_cold(ZNO_CIF)))
+    suite.append(Benchmark("physics.analyze_structure_cached[ZnO]", lambda: analyze_structure(ZNO_CIF), rounds=50))
+    metrics = zno_metrics()
+    suite.append(Benchmark("physics.validate_results", lambda: validate_results(metrics, "Oxide"), rounds=200))
+    suite.extend(dedup_benchmarks())
+    return suite
+
+
+def dedup_benchmarks(count=64):
+    """Clustering a batch of near-identical predictions into a fresh structure index."""
+    from component.structure_cache import get_entry
+    from component.structure_index import StructureIndex
+
+    workdir = tempfile.mkdtemp(prefix="matnexus-bench-dedup-")
+    fresh = iter(range(10_000))
+
+    def setup():
+        # Fixtures are built on first use, so a filtered run never pays for (or trips over) them
+        cifs = perturbed_cifs(count)
+        for cif in cifs:
+            get_entry(cif)  # parsing is timed by analyze_structure; here only prefilter + matching counts
+        return StructureIndex(os.path.join(workdir, f"index-{next(fresh)}.sqlite")), cifs
+
+    return [Benchmark(f"structure.dedup[{count} perturbed ZnO]", lambda args: args[0].cluster(args[1]), setup=setup)]
+
+
+def simulation_benchmarks(sizes):
+    from component.simulator import (
+        clear_render_cache, decimate, generate_xrd_plot, plot_xrd_overlay, plot_xrd_pattern, render_xrd_png,
+        simulate_xrd_pattern
+    )
+    from component.xrd_engine import simulate_patterns
+
+    suite = []
+    for n in sizes:
+        # The engine on the full supercell (no parsing, no pattern cache): only the diffraction math counts
+        structure = supercell(n)
+        suite.append(Benchmark(f"xrd.simulate[{n}x{n}x{n}]", lambda structure=structure: simulate_patterns([structure])))
+
+    two_theta, intensity = simulate_xrd_pattern(ZNO_CIF)
+    suite.append(Benchmark("xrd.plot[ZnO]", lambda: plot_xrd_pattern(two_theta, intensity)))
+    suite.append(Benchmark("xrd.generate_xrd_plot[ZnO]", generate_xrd_plot, setup=_cold(ZNO_CIF)))
+
+    def uncached_png():
+        clear_render_cache()
+        return ZNO_CIF
+
+    suite.append(Benchmark("xrd.render_png[ZnO]", render_xrd_png, setup=uncached_png))
+    suite.append(Benchmark("xrd.render_png_cached[ZnO]", lambda: render_xrd_png(ZNO_CIF), rounds=50))
+
+    # A dense measured trace (e.g. a raw diffractometer scan) drawn under the sticks
+    scan = np.linspace(10, 80, 100_000)
+    counts = 5 + np.interp(scan, two_theta, intensity, left=0, right=0)
+    suite.append(Benchmark("xrd.decimate[100k points]", lambda: decimate(scan, counts), rounds=20))
+    suite.append(Benchmark("xrd.plot_overlay[100k points]",
+                           lambda: plot_xrd_overlay([("ZnO", two_theta, intensity)], (scan, counts))))
+    return suite
+
+
+def reporting_benchmarks(phase_counts=(1, 4, 16)):
+    from component.discovery import extract_cifs
+    from component.reporter import generate_markdown_report
+
+    analysis_text = model_response([ZNO_CIF])
+    metrics = zno_metrics()
+    suite = [Benchmark("report.generate_markdown_report",
+                       lambda: generate_markdown_report(analysis_text, metrics, "Oxide"), rounds=200)]
+    for count in phase_counts:
+        text = model_response([supercell_cif(2)] * count)
+        suite.append(Benchmark(f"report.extract_cifs[{count} phases]", lambda text=text: extract_cifs(text), rounds=50))
+    return suite
+
+
+def end_to_end_benchmarks(gemini_latency, mp_latency, rounds=3):
+    """Discovery runs against the offline stubs, so the timing is deterministic and free."""
+    from component.discovery import MODEL_NAME, PHASE_ID_PROMPT, band_gap_prompt, closed_cif, extract_cif, run_discovery
+    from component.gemini_client import stream_text
+    from component.physics_engine import analyze_structure
+    from component.pipeline import Stage, from_future, prestart, run_pipeline
+    from component.simulator import generate_xrd_plot
+
+    client = stubs.StubGeminiClient(latency=gemini_latency)
+    get_mp_reference = stubs.stub_mp_reference(latency=mp_latency)
+
+    def sequential(_):
+        with mock.patch("component.mp_client.get_mp_reference", get_mp_reference):
+            return run_discovery(client, [], "Oxide").get("xrd_png")
+
+    def pipelined(_):
+        # The Lab Debugger flow: streamed answer, CIF work started early, concurrent stages
+        early = {}
+
+        def on_text(text):
+            cif = not early and closed_cif(text)
+            if cif:
+                early.update(cif=cif, analysis=prestart(analyze_structure, cif), xrd=prestart(generate_xrd_plot, cif))
+
+        text = stream_text(client, MODEL_NAME, [PHASE_ID_PROMPT], on_text=on_text)
+        cif = early.get("cif") or extract_cif(text)
+        stages = [
+            Stage("analysis", from_future(early["analysis"]) if early else analyze_structure, deps=["cif_string"]),
+            Stage("mp_ref", lambda analysis: get_mp_reference(analysis["formula"]), deps=["analysis"]),
+            Stage("dft", lambda analysis: stream_text(client, MODEL_NAME, [band_gap_prompt(analysis["formula"]), cif]),
+                  deps=["analysis"]),
+            Stage("xrd", from_future(early["xrd"]) if early else generate_xrd_plot, deps=["cif_string"]),
+        ]
+        return run_pipeline(stages, inputs={"cif_string": cif})["xrd"].value
+
+    return [
+        Benchmark("e2e.run_discovery", sequential, setup=_cold(None), rounds=rounds),
+        Benchmark("e2e.pipeline", pipelined, setup=_cold(None), rounds=rounds),
+    ]
+
+
+def load_thresholds(path=THRESHOLDS_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def tolerance_for(name, thresholds):
+    """Allowed median ratio for a benchmark: exact name, then the first matching glob, then the default."""
+    if name in thresholds:
+        return thresholds[name]
+    for pattern, tolerance in thresholds.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            return tolerance
+    return DEFAULT_TOLERANCE
+
+
+def compare(results, baseline, thresholds):
+    """Benchmarks whose median grew past their tolerance relative to the baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or previous["median"] <= 0:
+            continue
+        ratio = current["median"] / previous["median"]
+        limit = tolerance_for(name, thresholds)
+        if ratio > limit:
+            regressions.append({"name": name, "ratio": ratio, "limit": limit,
+                                "baseline": previous["median"], "median": current["median"]})
+    return regressions
+
+
+def run_suite(benchmarks, pattern="*"):
+    results = {}
+    for bench in benchmarks:
+        if not fnmatch.fnmatchcase(bench.name, pattern):
+            continue
+        results[bench.name] = bench.run()
+        print(f"{bench.name:<45} median {results[bench.name]['median'] * 1e3:10.3f} ms"
+              f"  (min {results[bench.name]['min'] * 1e3:.3f} ms, {results[bench.name]['rounds']} rounds)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MatNexus physics, simulation, reporting and pipeline hot paths.")
+    parser.add_argument("--out", default=os.path.join("benchmarks", "results.json"), help="Where the JSON results are written")
+    parser.add_argument("--baseline", help="Earlier results JSON to check for regressions (exit code 1 on regression)")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH, help="JSON of allowed median ratios per benchmark name or glob")
+    parser.add_argument("--filter", default="*", help="Only run benchmarks whose name matches this glob")
+    parser.add_argument("--quick", action="store_true", help="Smaller supercells only (CI smoke run)")
+    parser.add_argument("--gemini-latency", type=float, default=stubs.GEMINI_LATENCY)
+    parser.add_argument("--mp-latency", type=float, default=stubs.MP_LATENCY)
+    args = parser.parse_args()
+
+    print(f"Scratch state in {isolate_state()}")
+    sizes = SUPERCELL_SIZES[:2] if args.quick else SUPERCELL_SIZES
+    benchmarks = (
+        physics_benchmarks(sizes)
+        + simulation_benchmarks(sizes)
+        + reporting_benchmarks()
+        + end_to_end_benchmarks(args.gemini_latency, args.mp_latency)
+    )
+    results = run_suite(benchmarks, args.filter)
+
+    report = {
+        "meta": {
+            "created": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "gemini_latency": args.gemini_latency,
+            "mp_latency": args.mp_latency
+        },
+        "results": results
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, load_thresholds(args.thresholds))
+        for r in regressions:
+            print(f"REGRESSION {r['name']}: {r['baseline'] * 1e3:.3f} ms -> {r['median'] * 1e3:.3f} ms "
+                  f"({r['ratio']:.2f}x, limit {r['limit']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import time
+from types import SimpleNamespace
+
+from benchmarks.fixtures import ZNO_CIF, model_response
+
+# Default latencies (seconds) of the stand-ins for the remote services
+GEMINI_LATENCY = 0.5
+MP_LATENCY = 0.2
+
+
+class _StubModels:
+    def __init__(self, latency, text, chunks):
+        self.latency = latency
+        self.text = text
+        self.chunks = chunks
+        self.calls = 0
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(text=self.text, usage_metadata=None)
+
+    def generate_content_stream(self, model, contents, config=None, **kwargs):
+        """Splits the canned answer into `chunks` pieces spread over the latency."""
+        self.calls += 1
+        size = max(1, len(self.text) // self.chunks)
+        for start in range(0, len(self.text), size):
+            time.sleep(self.latency / self.chunks)
+            yield SimpleNamespace(text=self.text[start:start + size], usage_metadata=None)
+
+
+class StubGeminiClient:
+    """
+    Offline stand-in for genai.Client: every call sleeps for `latency` seconds
+    and answers with a canned phase-ID response (ZnO unless `text` is given).
+    """
+
+    def __init__(self, latency=GEMINI_LATENCY, text=None, chunks=20):
+        self.models = _StubModels(latency, text or model_response([ZNO_CIF]), chunks)
+
+
+def stub_mp_reference(latency=MP_LATENCY):
+    """get_mp_reference replacement that sleeps and returns a fixed ZnO entry."""
+    def get_mp_reference(formula):
+        time.sleep(latency)
+        return {"mp_id": "mp-2133", "density": 5.61, "space_group": "P6_3mc", "volume": 48.4, "energy_above_hull": 0.0}
+    return get_mp_reference
@@ -0,0 +1,169 @@
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+RESULTS_FILE = "results.jsonl"
+
+# Each worker process builds its own Gemini client once
+_client = None
+
+
+def load_samples(source, material_class="Unknown"):
+    """
+    Reads the samples of a batch. `source` is either
+      * a directory whose sub-directories each hold one XRD/SEM image set, or
+      * a JSONL manifest with {"id", "images", "material_class"} per line
+        (image paths are relative to the manifest).
+    Returns a list of {"id", "images", "material_class"} dicts.
+    """
+    samples = []
+    if os.path.isdir(source):
+        for sample_dir in sorted(glob.glob(os.path.join(source, "*"))):
+            if not os.path.isdir(sample_dir):
+                continue
+            images = sorted(
+                path for path in glob.glob(os.path.join(sample_dir, "*"))
+                if path.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            if images:
+                samples.append({"id": os.path.basename(sample_dir), "images": images, "material_class": material_class})
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                samples.append({
+                    "id": str(entry["id"]),
+                    "images": [os.path.join(base, path) for path in entry["images"]],
+                    "material_class": entry.get("material_class", material_class)
+                })
+    return samples
+
+
+def completed_samples(out_dir):
+    """IDs already finished successfully in a previous (possibly interrupted) run."""
+    done = set()
+    try:
+        with open(os.path.join(out_dir, RESULTS_FILE)) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by the interruption
+                if record.get("status") == "ok":
+                    done.add(record["id"])
+    except OSError:
+        pass
+    return done
+
+
+def _init_worker():
+    global _client
+    from component.gemini_client import get_gemini_client
+    from component.response_cache import cache_responses
+    _client = cache_responses(get_gemini_client())
+
+
+def process_sample(sample, out_dir, client=None):
+    """
+    Runs the discovery pipeline for one sample, writes its CIF, XRD plot and
+    report next to the results file and returns a JSON-serializable record.
+    """
+    from component.discovery import run_discovery
+    from component.image_prep import preprocess_image, payload_savings, to_part
+
+    client = client or _client
+    if client is None:
+        return {"id": sample["id"], "status": "error", "error": "GEMINI_API_KEY is not set"}
+
+    started = time.time()
+    try:
+        prepared = []
+        for path in sample["images"]:
+            with open(path, "rb") as f:
+                prepared.append(preprocess_image(f.read(), os.path.basename(path)))
+        run = run_discovery(client, [to_part(p) for p in prepared], sample["material_class"])
+    except Exception as e:
+        return {"id": sample["id"], "status": "error", "error": str(e)}
+
+    record = {
+        "id": sample["id"],
+        "status": "error" if "error" in run else "ok",
+        "images": sample["images"],
+        "material_class": sample["material_class"],
+        "metrics": run.get("metrics"),
+        "cluster_id": run.get("cluster_id"),
+        "mp_ref": run.get("mp_ref"),
+        "dft_text": run.get("dft_text"),
+        "phases": [{k: v for k, v in p.items() if k != "xrd"} for p in run.get("phases", [])],
+        "payload": payload_savings(prepared),
+        "seconds": round(time.time() - started, 2)
+    }
+    if "error" in run:
+        record["error"] = run["error"]
+
+    if run.get("cif"):
+        record["cif_path"] = os.path.join(out_dir, f"{sample['id']}.cif")
+        with open(record["cif_path"], "w") as f:
+            f.write(run["cif"])
+    if run.get("report"):
+        record["report_path"] = os.path.join(out_dir, f"{sample['id']}_report.md")
+        with open(record["report_path"], "w") as f:
+            f.write(run["report"])
+    if run.get("xrd_png"):
+        record["xrd_path"] = os.path.join(out_dir, f"{sample['id']}_xrd.png")
+        with open(record["xrd_path"], "wb") as f:
+            f.write(run["xrd_png"])
+    return record
+
+
+def run_batch(source, out_dir, material_class="Unknown", workers=4):
+    """
+    Processes every sample of a batch across a process pool, appending one JSONL
+    record per finished sample. Samples already recorded as ok are skipped, so
+    re-running the same command resumes an interrupted batch.
+    Yields the records as they complete.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    done = completed_samples(out_dir)
+    pending = [s for s in load_samples(source, material_class) if s["id"] not in done]
+    if not pending:
+        return
+
+    with open(os.path.join(out_dir, RESULTS_FILE), "a") as results, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(process_sample, sample, out_dir): sample for sample in pending}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"id": futures[future]["id"], "status": "error", "error": str(e)}
+            # Flushed per sample: this file is the checkpoint
+            results.write(json.dumps(record, default=str) + "\n")
+            results.flush()
+            yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the MatNexus discovery pipeline headlessly over many image sets.")
+    parser.add_argument("source", help="Directory of sample folders, or a JSONL manifest")
+    parser.add_argument("out_dir", help="Where results.jsonl, CIFs, XRD plots and reports are written")
+    parser.add_argument("--material-class", default="Unknown",
+                        choices=["Oxide", "Perovskite", "Metal/Alloy", "2D Material", "Unknown"])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    for record in run_batch(args.source, args.out_dir, args.material_class, args.workers):
+        detail = record.get("metrics", {}) or {}
+        print(f"[{record['status']}] {record['id']} {detail.get('formula', record.get('error', ''))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import io
+
+import numpy as np
+from PIL import Image
+from scipy import ndimage
+
+# Pixels darker than this (0-255, all channels) count as axis/black ink
+DARK_LEVEL = 110
+
+# Minimum channel spread for a pixel to count as colored ink
+COLOR_SPREAD = 80
+
+# Hue bins used to separate colored traces
+HUE_BINS = 12
+
+# A color cluster needs at least this many pixels to be treated as a trace
+MIN_TRACE_PIXELS = 150
+
+# ...and must span this fraction of the plot width (drops labels, arrows and inset frames)
+MIN_TRACE_COVERAGE = 0.5
+
+# Color names for the hue bins, centered on 0°, 30°, 60°, ...
+HUE_NAMES = ("red", "orange", "yellow", "chartreuse", "green", "spring green",
+             "cyan", "azure", "blue", "violet", "magenta", "rose")
+
+# Peak picking: smoothing window (pixels), minimum height (% of max) and separation (degrees)
+SMOOTH_PIXELS = 3
+MIN_PEAK_HEIGHT = 5.0
+MIN_PEAK_SEPARATION = 0.4
+
+
+def _load_rgb(image):
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    elif not isinstance(image, Image.Image):
+        image = Image.open(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        rgba = image.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        image = flat
+    return np.asarray(image.convert("RGB"), dtype=np.int16)
+
+
+def detect_axes(rgb):
+    """
+    Finds the x-axis row (the darkest long line in the lower half), the
+    y-axis column (the darkest long line in the left half) and, for boxed
+    plots, the top frame row (a line about as long as the x axis).
+    Returns (x_axis_row, y_axis_col, x_start, x_end, top_row) in pixels.
+    """
+    dark = (rgb.max(axis=2) < DARK_LEVEL)
+    height, width = dark.shape
+
+    row_counts = dark.sum(axis=1)
+    x_axis_row = height // 2 + int(np.argmax(row_counts[height // 2:]))
+    frame_rows = np.nonzero(row_counts[:max(x_axis_row - 10, 0)] >= 0.9 * row_counts[x_axis_row])[0]
+    top_row = int(frame_rows[0]) + 2 if frame_rows.size else 0
+
+    col_counts = dark.sum(axis=0)
+    y_axis_col = int(np.argmax(col_counts[:width // 2]))
+
+    # The x-axis extent is the longest dark run on (or next to) the axis row
+    band = dark[max(0, x_axis_row - 1):x_axis_row + 2].any(axis=0)
+    labels, count = ndimage.label(band)
+    if count == 0:
+        return x_axis_row, y_axis_col, y_axis_col, width - 1, top_row
+    sizes = ndimage.sum(band, labels, index=np.arange(1, count + 1))
+    run = np.nonzero(labels == 1 + int(np.argmax(sizes)))[0]
+    return x_axis_row, y_axis_col, int(run[0]), int(run[-1]), top_row
+
+
+def detect_ticks(rgb, x_axis_row, x_start, x_end, depth=8):
+    """
+    Pixel columns of the major tick marks on the x axis (ticks may point in or out).
+    Major ticks are the longest ones; minor ticks are ignored, and so are the
+    y axis and the right frame unless they sit on the regular tick spacing.
+    """
+    dark = (rgb.max(axis=2) < DARK_LEVEL)
+    below = dark[x_axis_row + 2:x_axis_row + 2 + depth, x_start:x_end + 1]
+    above = dark[max(0, x_axis_row - 1 - depth):x_axis_row - 1, x_start:x_end + 1][::-1]
+
+    # Tick length = run of dark pixels starting at the axis line, per column
+    def run_length(band):
+        if band.size == 0:
+            return np.zeros(x_end - x_start + 1, dtype=int)
+        return np.cumprod(band, axis=0).sum(axis=0)
+
+    length = np.maximum(run_length(below), run_length(above))
+    if length.max() < 3:
+        return np.array([])
+    major = length >= max(3, 0.8 * length.max())
+    labels, count = ndimage.label(major)
+    centers = ndimage.center_of_mass(major, labels, index=np.arange(1, count + 1))
+    ticks = np.array([x_start + c[0] for c in centers])
+    if len(ticks) < 4:
+        return ticks
+    # Interior ticks set the spacing; the axis ends only count when they land on it
+    spacing = np.median(np.diff(ticks[1:-1]))
+    phase = (ticks - ticks[1]) / spacing
+    return ticks[np.abs(phase - np.round(phase)) < 0.15]
+
+
+def _trace_masks(plot):
+    """Boolean masks of the traces in the plot area: one per ink color, plus black."""
+    spread = plot.max(axis=2) - plot.min(axis=2)
+    colored = spread > COLOR_SPREAD
+    masks = []
+    if colored.sum() >= MIN_TRACE_PIXELS:
+        r, g, b = [plot[..., i].astype(float) for i in range(3)]
+        hue = (np.degrees(np.arctan2(np.sqrt(3) * (g - b), 2 * r - g - b)) + 360) % 360
+        # Bins are centered on the pure hues so anti-aliased red does not split at 0°/360°
+        hue_bin = ((hue + 180 / HUE_BINS) * HUE_BINS / 360).astype(int) % HUE_BINS
+        counts = np.bincount(hue_bin[colored], minlength=HUE_BINS)
+        for bin_index in np.nonzero(counts >= MIN_TRACE_PIXELS)[0]:
+            masks.append((HUE_NAMES[bin_index], colored & (hue_bin == bin_index)))
+    black = (plot.max(axis=2) < DARK_LEVEL) & ~colored
+    if black.sum() >= MIN_TRACE_PIXELS:
+        masks.append(("black", black))
+    return masks
+
+
+def _largest_component(mask):
+    """The biggest 8-connected blob: the trace itself, not labels or insets."""
+    labels, count = ndimage.label(mask, structure=np.ones((3, 3)))
+    if count == 0:
+        return mask
+    sizes = ndimage.sum(mask, labels, index=np.arange(1, count + 1))
+    return labels == 1 + int(np.argmax(sizes))
+
+
+def pick_peaks(two_theta, intensity, min_height=MIN_PEAK_HEIGHT, min_separation=MIN_PEAK_SEPARATION):
+    """
+    Vectorized peak picking: local maxima of the smoothed trace that dominate a
+    ±min_separation window and rise min_height (% of max) above the local baseline.
+    """
+    if len(intensity) < 3:
+        return np.array([]), np.array([])
+    step = np.median(np.diff(two_theta))
+    window = max(3, int(round(min_separation / step)) | 1)
+    smooth = np.convolve(intensity, np.ones(SMOOTH_PIXELS) / SMOOTH_PIXELS, mode="same")
+    local_max = smooth == ndimage.maximum_filter1d(smooth, size=window, mode="nearest")
+    baseline = ndimage.minimum_filter1d(smooth, size=window * 5, mode="nearest")
+    prominent = smooth - baseline >= min_height / 100 * smooth.max()
+    index = np.nonzero(local_max & prominent)[0]
+    # Flat tops produce runs of equal maxima: keep one index per run
+    if index.size:
+        index = index[np.r_[True, np.diff(index) > 1]]
+    return two_theta[index], intensity[index]
+
+
+def match_peaks(observed, reference, reference_intensity=None, tolerance=0.3, two_theta_range=None):
+    """
+    Pairs each reference peak (e.g. a simulated pattern) with the nearest observed
+    peak within ±tolerance degrees 2θ. With `two_theta_range` (the span of the
+    digitized trace), reference peaks outside it are ignored rather than counted
+    as misses.
+    Returns the matched fraction (intensity-weighted when `reference_intensity`
+    is given), the mean 2θ shift (observed - reference) and the matched pairs.
+    """
+    observed = np.sort(np.asarray(observed, dtype=float))
+    reference = np.asarray(reference, dtype=float)
+    if reference_intensity is not None:
+        reference_intensity = np.asarray(reference_intensity, dtype=float)
+    if two_theta_range is not None:
+        inside = (reference >= two_theta_range[0]) & (reference <= two_theta_range[1])
+        reference = reference[inside]
+        if reference_intensity is not None:
+            reference_intensity = reference_intensity[inside]
+    if observed.size == 0 or reference.size == 0:
+        return {"score": 0.0, "mean_shift": None, "matched": 0, "pairs": []}
+
+    # Nearest observed neighbour of every reference peak via one searchsorted pass
+    right = np.clip(np.searchsorted(observed, reference), 1, observed.size - 1)
+    left = right - 1
+    if observed.size == 1:
+        left = right = np.zeros_like(right)
+    nearest = np.where(np.abs(observed[left] - reference) <= np.abs(observed[right] - reference),
+                       observed[left], observed[right])
+    shift = nearest - reference
+    hit = np.abs(shift) <= tolerance
+
+    weights = np.ones_like(reference) if reference_intensity is None else reference_intensity
+    return {
+        "score": float(weights[hit].sum() / max(weights.sum(), 1e-12)),
+        "mean_shift": float(shift[hit].mean()) if hit.any() else None,
+        "matched": int(hit.sum()),
+        "pairs": list(zip(reference[hit].tolist(), nearest[hit].tolist()))
+    }
+
+
+def digitize_xrd(image, tick_range):
+    """
+    Turns an XRD plot image (path, bytes, file object or PIL image) into numeric traces.
+    `tick_range` gives the 2θ values of the first and last major x-axis ticks as
+    printed on the plot (tick labels are not read, so there is no safe default;
+    falls back to the ends of the axis line if no ticks are found).
+    Returns {"curves": [{"label", "two_theta", "intensity", "peaks"}], "axes": {...}}
+    with intensities scaled to 0-100 per curve.
+
+    Known limits: stacked curves drawn in the same color come back as one trace
+    (the largest); where a trace is drawn under another one its peaks are hidden
+    and get lost; colored annotations that span most of the plot width (e.g.
+    reference-line bars in multi-sample figures) can come back as extra curves.
+    """
+    rgb = _load_rgb(image)
+    x_axis_row, y_axis_col, x_start, x_end, top_row = detect_axes(rgb)
+
+    ticks = detect_ticks(rgb, x_axis_row, x_start, x_end)
+    if len(ticks) >= 2:
+        px_first, px_last = ticks[0], ticks[-1]
+    else:
+        px_first, px_last = float(x_start), float(x_end)
+    degrees_per_px = (tick_range[1] - tick_range[0]) / max(px_last - px_first, 1)
+
+    # Plot area: inside the axes (and top frame), minus a small margin for the lines
+    left = max(y_axis_col, x_start) + 3
+    right = x_end - 3
+    plot = rgb[top_row:x_axis_row - 2, left:right]
+
+    curves = []
+    for label, mask in _trace_masks(plot):
+        trace = _largest_component(mask)
+        present = trace.any(axis=0)
+        if present.sum() < MIN_TRACE_COVERAGE * trace.shape[1]:
+            continue
+        # Topmost pixel per column follows peak apexes; gaps are interpolated
+        top = np.argmax(trace, axis=0).astype(float)
+        columns = np.arange(trace.shape[1])
+        span = slice(np.argmax(present), len(present) - np.argmax(present[::-1]))
+        columns, top, present = columns[span], top[span], present[span]
+        top = np.interp(columns, columns[present], top[present])
+
+        height = (trace.shape[0] - top)
+        height = height - np.percentile(height, 5)
+        intensity = np.clip(height / max(height.max(), 1) * 100, 0, None)
+        two_theta = tick_range[0] + (columns + left - px_first) * degrees_per_px
+        peak_x, peak_y = pick_peaks(two_theta, intensity)
+        curves.append({
+            "label": label,
+            "two_theta": two_theta,
+            "intensity": intensity,
+            "peaks": {"two_theta": peak_x, "intensity": peak_y}
+        })
+
+    return {
+        "curves": curves,
+        "axes": {
+            "x_axis_row": x_axis_row,
+            "y_axis_col": y_axis_col,
+            "top_row": top_row,
+            "ticks": ticks,
+            "degrees_per_px": degrees_per_px
+        }
+    }
@@ -0,0 +1,185 @@
+import re
+
+MODEL_NAME = "gemini-3-flash-preview"
+
+PHASE_ID_PROMPT = "ACT AS: A Senior Characterization Scientist. Analyze these images. 1. Identify Phase. 2. Describe Morphology. 3. Correlate XRD/SEM. Provide one valid .CIF block starting with 'data_' for each phase present."
+
+def band_gap_prompt(formula):
+    """Prompt for the DFT-proxy band-gap prediction."""
+    return f"Predict Band Gap (eV) and Electronic Nature for this CIF: {formula}. Use a professional table format."
+
+# Fence language tags that may hold a CIF ("" is an untagged fence)
+CIF_FENCE_TAGS = ("", "cif")
+
+# One CIF value: a quoted string or a bare word
+_CIF_TOKEN = re.compile(r"'[^']*'|\"[^\"]*\"|\S+")
+
+def _cif_blocks(lines):
+    """
+    Splits CIF lines into their data_ blocks as (name, cif) pairs. A block needs
+    a name and at least one _cell_ or _atom_site tag; anything else (a bare
+    "data_", a variable called data_frame) is not a structure.
+    """
+    cifs = []
+    for line in lines:
+        if line.lstrip().startswith("data_"):
+            cifs.append([line.strip()])
+        elif cifs:
+            cifs[-1].append(line)
+    pairs = [(lines_[0][len("data_"):].strip(), "\n".join(lines_).strip()) for lines_ in cifs]
+    return [
+        (name, cif) for name, cif in pairs
+        if name and any(line.lstrip().startswith(("_cell_", "_atom_site")) for line in cif.splitlines())
+    ]
+
+def _fenced_cifs(part):
+    """The data_ blocks of one fenced part, or none when its language tag isn't cif."""
+    tag, _, body = part.partition("\n")
+    tag = tag.strip().lower()
+    if tag.startswith("data_"):
+        # No tag: the CIF starts on the fence line itself
+        tag, body = "", part
+    if tag not in CIF_FENCE_TAGS:
+        return []
+    return _cif_blocks(body.strip().splitlines())
+
+def _leading_cif_lines(lines):
+    """
+    The lines from the start of `lines` that still read as CIF: tags, loop_
+    headers, loop rows that fit the loop's columns, ;-delimited text fields and
+    comments. Stops at the first line of prose (or a blank line that isn't
+    followed by more tags) and drops a trailing half-filled loop row.
+    """
+    kept = []
+    complete = 0
+    columns = 0
+    filled = 0
+    in_header = False
+    in_text = False
+    expect_value = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if in_text:
+            in_text = not line.startswith(";")
+        elif not stripped:
+            following = next((rest.strip() for rest in lines[i + 1:] if rest.strip()), "")
+            if not following.startswith(("_", "loop_", "data_", "#")):
+                break
+        elif line.startswith(";"):
+            in_text = True
+            expect_value = False
+        elif stripped.startswith(("data_", "#")):
+            columns = filled = 0
+            in_header = expect_value = False
+        elif stripped.startswith("loop_"):
+            columns = filled = 0
+            in_header = True
+        elif stripped.startswith("_"):
+            if in_header:
+                columns += 1
+            else:
+                columns = filled = 0
+                # A tag without a value on its line takes the next line as its value
+                expect_value = len(_CIF_TOKEN.findall(stripped)) == 1
+        elif expect_value:
+            expect_value = False
+        elif columns:
+            in_header = False
+            filled += len(_CIF_TOKEN.findall(stripped))
+            if filled > columns:
+                break
+            filled %= columns
+        else:
+            break
+        kept.append(line)
+        if not (in_text or filled or expect_value):
+            complete = len(kept)
+    return kept[:complete]
+
+def extract_cifs(text, closed_only=False):
+    """
+    Every CIF (data_ block) in a model response, in order, as a list of
+    {"name", "cif"} dicts. Names are unique labels: a repeated data_ name gets
+    an ordinal ("ZnO", "ZnO #2"), so results keyed by name never collide.
+    Only untagged fences and fences tagged cif are read; fenced blocks holding
+    several data_ blocks are split.
+    Without any fence, the CIF lines from the first data_ line on are used,
+    up to the first line that isn't CIF.
+    With closed_only, a fence that is still open (a streaming response) is ignored.
+    """
+    if "data_" not in text:
+        return []
+    parts = text.split("```")
+    # Odd segments are inside fences; with an odd number of fences the last one is still open
+    fenced = parts[1::2]
+    if len(parts) % 2 == 0:
+        fenced = fenced[:-1] if closed_only else fenced
+    blocks = [pair for part in fenced for pair in _fenced_cifs(part)]
+    if not blocks and len(parts) == 1 and not closed_only:
+        start = re.search(r"^[ \t]*data_\S", text, re.MULTILINE)
+        if start:
+            blocks = _cif_blocks(_leading_cif_lines(text[start.start():].splitlines()))
+    phases = []
+    used = set()
+    for name, cif in blocks:
+        label, ordinal = name, 1
+        while label in used:
+            ordinal += 1
+            label = f"{name} #{ordinal}"
+        used.add(label)
+        phases.append({"name": label, "cif": cif})
+    return phases
+
+def extract_cif(text):
+    """
+    Returns the first CIF block of a model response, or an empty string if there is none.
+    """
+    cifs = extract_cifs(text)
+    return cifs[0]["cif"] if cifs else ""
+
+def closed_cif(text):
+    """
+    Like extract_cif, but only considers fenced blocks that are already closed,
+    so it can be called on a response that is still streaming in.
+    """
+    cifs = extract_cifs(text, closed_only=True)
+    return cifs[0]["cif"] if cifs else ""
+
+def run_discovery(client, images, material_class="Unknown"):
+    """
+    Headless version of the Lab Debugger discovery run for one image set.
+    Returns a dict with the model analysis, CIF, metrics, MP reference,
+    band-gap prediction, XRD image (PNG bytes) and research brief.
+    """
+    # Imported here so the prompts and CIF helpers stay cheap to import (the app loads them at startup)
+    from component.physics_engine import analyze_structure
+    from component.simulator import render_xrd_png
+    from component.reporter import generate_markdown_report
+    from component.mp_client import get_mp_reference
+    from component.phases import analyze_phases
+    from component.structure_index import cluster_id
+
+    response = client.models.generate_content(model=MODEL_NAME, contents=[PHASE_ID_PROMPT, *images])
+    run = {"analysis_text": response.text, "cif": extract_cif(response.text)}
+    if not run["cif"]:
+        run["error"] = "No CIF block in model response"
+        return run
+
+    results = analyze_structure(run["cif"])
+    run["metrics"] = results
+    run["report"] = generate_markdown_report(response.text, results, material_class)
+    if "error" in results:
+        run["error"] = results["error"]
+        return run
+
+    # Structures matching an earlier run share its ID (already resolved by analyze_structure, so this is a memo hit)
+    run["cluster_id"] = cluster_id(run["cif"])
+    run["mp_ref"] = get_mp_reference(results['formula'])
+    dft_res = client.models.generate_content(model=MODEL_NAME, contents=[band_gap_prompt(results['formula']), run["cif"]])
+    run["dft_text"] = dft_res.text
+    phases = extract_cifs(response.text)
+    run["xrd_png"] = render_xrd_png([(p["name"], p["cif"]) for p in phases] or run["cif"])
+    if len(phases) > 1:
+        # Batch mode already parallelizes over samples, so phases run inline here
+        run["phases"] = analyze_phases(phases, material_class, workers=1)
+    return run
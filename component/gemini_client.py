@@ -1,43 +1,167 @@
-import os 
-import time 
-from google import genai
+import os
+import time
+import json
+import logging
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load variables from .env
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Concurrent uploads to the Files API
+UPLOAD_WORKERS = int(os.getenv("MATNEXUS_UPLOAD_WORKERS", "4"))
+
+# Content hash -> uploaded file name, so the same paper is never uploaded twice
+REGISTRY_PATH = os.getenv("MATNEXUS_FILE_REGISTRY", os.path.join(".matnexus", "uploaded_files.json"))
+
+_registry_lock = threading.Lock()
+
+def has_api_key():
+    """Whether a Gemini key is configured (cheap: doesn't import the SDK)."""
+    return bool(os.getenv("GEMINI_API_KEY"))
+
 def get_gemini_client():
     """Initializes and returns the Gemini 3 Client."""
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         return None
+    # Imported here: the SDK is slow to load and the UI only needs it once a run starts
+    from google import genai
     return genai.Client(api_key=api_key)
 
-def process_uploaded_pdfs(client, pdf_files):
+def stream_text(client, model, contents, on_text=None, cancel=None):
     """
-    Handles the temporary saving, uploading, and processing 
-    of multiple PDFs for the Gemini Files API.
+    Streams a generate_content call and returns the full response text.
+    `on_text(text_so_far)` is called after every chunk so the UI can render
+    the answer while it is still being generated. Once the optional `cancel`
+    event is set, the stream is closed and the text so far is returned
+    without further on_text calls.
     """
-    gemini_files = []
-    
-    for pdf in pdf_files:
-        # 1. Save temp file locally to upload
-        temp_path = f"temp_{pdf.name}"
-        with open(temp_path, "wb") as f:
-            f.write(pdf.getbuffer())
-        
+    text = ""
+    stream = client.models.generate_content_stream(model=model, contents=contents)
+    try:
+        for chunk in stream:
+            if cancel is not None and cancel.is_set():
+                break
+            if not chunk.text:
+                continue
+            text += chunk.text
+            if on_text:
+                on_text(text)
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+    return text
+
+def _file_digest(pdf, chunk_size=1 << 20):
+    """SHA-256 of an uploaded file, read in chunks."""
+    digest = hashlib.sha256()
+    pdf.seek(0)
+    for chunk in iter(lambda: pdf.read(chunk_size), b""):
+        digest.update(chunk)
+    pdf.seek(0)
+    return digest.hexdigest()
+
+def _load_registry():
+    try:
+        with open(REGISTRY_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _remember_upload(digest, file_name):
+    with _registry_lock:
+        registry = _load_registry()
+        registry[digest] = {"name": file_name, "uploaded_at": time.time()}
+        os.makedirs(os.path.dirname(REGISTRY_PATH) or ".", exist_ok=True)
+        temp_path = f"{REGISTRY_PATH}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(registry, f)
+        os.replace(temp_path, REGISTRY_PATH)
+
+def _wait_until_active(client, myfile, first_delay=0.5, max_delay=8.0, timeout=300):
+    """Polls a processing file with exponential backoff until it leaves PROCESSING."""
+    delay = first_delay
+    deadline = time.monotonic() + timeout
+    while myfile.state == "PROCESSING" and time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        myfile = client.files.get(name=myfile.name)
+    return myfile
+
+def _reuse_upload(client, digest):
+    """Returns the previously uploaded file for this content if it is still ACTIVE."""
+    with _registry_lock:
+        known = _load_registry().get(digest)
+    if not known:
+        return None
+    try:
+        # Files API uploads expire, so confirm the handle is still valid
+        myfile = _wait_until_active(client, client.files.get(name=known["name"]))
+    except Exception:
+        return None
+    return myfile if myfile.state == "ACTIVE" else None
+
+def _upload_pdf(client, pdf, digest, temp_dir):
+    myfile = _reuse_upload(client, digest)
+    if myfile is not None:
+        return myfile
+
+    # 1. Stream the upload into the temp directory (no full in-memory copy)
+    temp_path = os.path.join(temp_dir, f"{digest}.pdf")
+    pdf.seek(0)
+    with open(temp_path, "wb") as f:
+        shutil.copyfileobj(pdf, f, 1 << 20)
+
+    try:
         # 2. Upload using the correct 'file' argument
-        myfile = client.files.upload(file=temp_path)
-        
+        myfile = client.files.upload(file=temp_path, config={"display_name": pdf.name})
+
         # 3. Wait for the 'ACTIVE' state
-        while myfile.state == "PROCESSING":
-            time.sleep(2)
-            myfile = client.files.get(name=myfile.name)
-            
-        if myfile.state == "FAILED":
-            continue
-            
-        gemini_files.append(myfile)
-        os.remove(temp_path) # Cleanup
-        
-    return gemini_files
\ No newline at end of file
+        myfile = _wait_until_active(client, myfile)
+    finally:
+        os.remove(temp_path) # Cleanup, also when processing failed
+
+    if myfile.state != "ACTIVE":
+        logger.warning("Upload Error: %s ended in state %s", pdf.name, myfile.state)
+        return None
+
+    _remember_upload(digest, myfile.name)
+    return myfile
+
+def process_uploaded_pdfs(client, pdf_files, max_workers=UPLOAD_WORKERS):
+    """
+    Handles the temporary saving, uploading, and processing
+    of multiple PDFs for the Gemini Files API.
+    Uploads run concurrently, and papers already uploaded (same content hash)
+    reuse their existing file handle.
+    """
+    # Identical papers in one batch are only uploaded once
+    unique = {}
+    for pdf in pdf_files:
+        unique.setdefault(_file_digest(pdf), pdf)
+
+    with tempfile.TemporaryDirectory(prefix="matnexus_pdfs_") as temp_dir:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique)))) as pool:
+            futures = {
+                digest: pool.submit(_upload_pdf, client, pdf, digest, temp_dir)
+                for digest, pdf in unique.items()
+            }
+            gemini_files = []
+            for digest, future in futures.items():
+                try:
+                    myfile = future.result()
+                except Exception as e:
+                    logger.warning("Upload Error: %s: %s", unique[digest].name, e)
+                    continue
+                if myfile is not None:
+                    gemini_files.append(myfile)
+
+    return gemini_files
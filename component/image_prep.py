@@ -0,0 +1,154 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageChops, ImageOps
+
+# Longest side (pixels) each kind of image is downscaled to
+TARGET_SIZE = {"xrd": 1024, "sem": 1536}
+
+# JPEG quality for micrographs; plots are stored as lossless PNG
+JPEG_QUALITY = 85
+
+# Colors kept when a color plot is palettized
+PLOT_COLORS = 64
+
+# Formats the model accepts as-is
+SUPPORTED_MIME_TYPES = ("image/png", "image/jpeg", "image/webp")
+
+CACHE_SIZE = int(os.getenv("MATNEXUS_IMAGE_CACHE_SIZE", "64"))
+
+# Whole filename words that name the image type ("ZnO_SEM2.png", "sample-xrd.jpg")
+XRD_WORDS = {"xrd", "diffraction", "diffractogram", "diffractograms"}
+MICROGRAPH_WORDS = {"sem", "tem", "stem", "micrograph", "micrographs"}
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def kind_from_filename(filename):
+    """'xrd' or 'sem' when a whole word of the filename names the image type, else None."""
+    words = set(re.split(r"[^a-z]+", os.path.splitext(filename.lower())[0]))
+    if words & XRD_WORDS:
+        return "xrd"
+    if words & MICROGRAPH_WORDS:
+        return "sem"
+    return None
+
+
+def classify_image(img, filename=""):
+    """
+    'xrd' for plots/diffractograms, 'sem' for micrographs. The filename wins when
+    one of its words names the type (words are split on anything but letters, so
+    "system" or "item" never count as TEM); otherwise plots are recognized by
+    their mostly white background.
+    """
+    kind = kind_from_filename(filename)
+    if kind:
+        return kind
+    thumb = np.asarray(img.convert("L").resize((128, 128)))
+    return "xrd" if np.mean(thumb > 235) > 0.5 else "sem"
+
+
+def crop_borders(img, tolerance=12):
+    """Trims uniform margins (white plot borders, black scanner frames)."""
+    rgb = img.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    diff = ImageChops.difference(rgb, background).convert("L")
+    bbox = diff.point(lambda v: 255 if v > tolerance else 0).getbbox()
+    if bbox and (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) < rgb.size[0] * rgb.size[1]:
+        return img.crop(bbox)
+    return img
+
+
+def is_effectively_gray(img, spread=12):
+    """True when the color channels carry no extra information (SEM, B/W plots)."""
+    thumb = np.asarray(img.convert("RGB").resize((256, 256)), dtype=np.int16)
+    channel_spread = thumb.max(axis=2) - thumb.min(axis=2)
+    return np.percentile(channel_spread, 99) <= spread
+
+
+def _encode(img, kind):
+    buffer = io.BytesIO()
+    if kind == "sem":
+        img.convert("L" if img.mode == "L" else "RGB").save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        return buffer.getvalue(), "image/jpeg"
+    if img.mode != "L":
+        # Plots use few distinct colors; a palette keeps them crisp at a fraction of the size
+        img = img.convert("RGB").quantize(colors=PLOT_COLORS)
+    img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue(), "image/png"
+
+
+def preprocess_image(data, filename="", kind=None):
+    """
+    Shrinks one uploaded image before it is sent to the model: fixes EXIF rotation,
+    crops borders, downscales to the target size for its kind, drops color when it
+    carries no information and re-encodes without metadata.
+    If the result would be larger than the upload, the upload is sent unchanged.
+    Returns a dict with the encoded `data`, `kind`, `mime_type` and the
+    `original_bytes` / `bytes` sizes; to_part() turns it into a Gemini part.
+    Results are cached by content hash and the kind the filename implies, so
+    the same bytes under a differently named upload are classified again.
+    """
+    key = (hashlib.sha256(data).hexdigest(), kind or kind_from_filename(filename))
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    original = Image.open(io.BytesIO(data))
+    original_mime = Image.MIME.get(original.format)
+    img = ImageOps.exif_transpose(original)
+    if img.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white so plots keep their background
+        rgba = img.convert("RGBA")
+        img = Image.new("RGB", rgba.size, (255, 255, 255))
+        img.paste(rgba, mask=rgba.getchannel("A"))
+    kind = kind or classify_image(img, filename)
+
+    img = crop_borders(img)
+    target = TARGET_SIZE[kind]
+    if max(img.size) > target:
+        img.thumbnail((target, target), Image.LANCZOS)
+    if is_effectively_gray(img):
+        img = img.convert("L")
+
+    # No EXIF is passed to save(), and clearing info drops ICC profiles and text chunks
+    img.info = {}
+    encoded, mime_type = _encode(img, kind)
+    if len(encoded) >= len(data) and original_mime in SUPPORTED_MIME_TYPES:
+        # Already compact (e.g. a lossy WebP): re-encoding would only grow it
+        encoded, mime_type = data, original_mime
+
+    prepared = {
+        "data": encoded,
+        "kind": kind,
+        "mime_type": mime_type,
+        "size": img.size,
+        "original_bytes": len(data),
+        "bytes": len(encoded)
+    }
+    with _lock:
+        _cache[key] = prepared
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return prepared
+
+
+def to_part(prepared):
+    """The Gemini part for a preprocessed image (google-genai is only imported here, off the preview path)."""
+    from google.genai import types
+
+    return types.Part.from_bytes(data=prepared["data"], mime_type=prepared["mime_type"])
+
+
+def payload_savings(prepared_images):
+    """Totals for a package of preprocessed images: original, sent and saved bytes."""
+    original = sum(p["original_bytes"] for p in prepared_images)
+    sent = sum(p["bytes"] for p in prepared_images)
+    return {"original_bytes": original, "bytes": sent, "saved_bytes": original - sent}
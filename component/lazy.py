@@ -0,0 +1,118 @@
+import importlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Set to 0 to skip the background preload (e.g. on memory-constrained hosts)
+WARMUP_ENABLED = os.getenv("MATNEXUS_WARMUP", "1").lower() not in ("0", "false", "no")
+
+# Heavy modules, in the order the first discovery run needs them
+WARMUP_MODULES = (
+    "google.genai",
+    "component.gemini_client",
+    "component.image_prep",
+    "component.physics_engine",
+    "component.simulator",
+    "component.mp_client",
+    "component.digitizer",
+    "component.phases",
+    "component.visualizer",
+    "component.literature_index",
+)
+
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access, so a
+    Streamlit page can render before pymatgen, matplotlib or google-genai load.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            # import_module holds the per-module import lock, so a concurrent warm-up is safe
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
+
+
+def _warm(modules, tasks):
+    started = time.perf_counter()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning("Warm-up import of %s failed: %s", name, e)
+    for task in tasks:
+        try:
+            task()
+        except Exception as e:
+            logger.warning("Warm-up task %s failed: %s", getattr(task, "__name__", task), e)
+    logger.info("Warm-up finished in %.1f s", time.perf_counter() - started)
+
+
+def start_warmup(modules=WARMUP_MODULES, tasks=()):
+    """
+    Preloads the heavy modules (then runs the optional `tasks`) on a daemon
+    thread, once per process. Call it after the first paint.
+    Returns the thread, or None when warm-up is disabled or already started.
+    """
+    global _warmup_thread
+    if not WARMUP_ENABLED:
+        return None
+    with _warmup_lock:
+        if _warmup_thread is not None:
+            return None
+        _warmup_thread = threading.Thread(target=_warm, args=(modules, tasks), name="matnexus-warmup", daemon=True)
+        _warmup_thread.start()
+        return _warmup_thread
+
+
+def warm_structure_stack():
+    """
+    Parses and simulates a tiny structure so pymatgen's and spglib's first-call
+    costs are paid early. Goes below analyze_structure/simulate_xrd_pattern so
+    the sample never lands in the structure index.
+    """
+    from component.structure_cache import get_entry
+    from component.xrd_engine import simulate_patterns
+
+    cif = """data_Po
+_cell_length_a 3.345
+_cell_length_b 3.345
+_cell_length_c 3.345
+_cell_angle_alpha 90
+_cell_angle_beta 90
+_cell_angle_gamma 90
+_symmetry_space_group_name_H-M 'P 1'
+loop_
+ _atom_site_type_symbol
+ _atom_site_label
+ _atom_site_fract_x
+ _atom_site_fract_y
+ _atom_site_fract_z
+ _atom_site_occupancy
+  Po  Po0  0.0  0.0  0.0  1
+"""
+    entry = get_entry(cif)
+    entry.metrics(symprec=0.1)
+    simulate_patterns([entry.structure])
@@ -0,0 +1,310 @@
+import argparse
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Where the Literature Miner keeps its index
+INDEX_PATH = os.getenv("MATNEXUS_LITERATURE_INDEX", os.path.join(".matnexus", "literature_index"))
+
+# Chunk size and overlap in words; tables are kept whole up to MAX_TABLE_WORDS
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+MAX_TABLE_WORDS = 400
+
+# Excerpts sent to the model per question
+TOP_K = 8
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# A line counts as a table row when it has at least this many numeric cells
+TABLE_MIN_NUMBERS = 2
+TABLE_MIN_ROWS = 3
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+_NUMBER = re.compile(r"(?<![a-zA-Z])[-+]?\d+(?:\.\d+)?(?![a-zA-Z])")
+
+
+def tokenize(text):
+    """Lowercase word/number tokens; keeps formulas (TiO2), decimals (3.25) and hyphenated terms."""
+    return _TOKEN.findall(text.lower())
+
+
+def extract_pages(pdf_bytes):
+    """Text of each PDF page (needs pypdf)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def _split_tables(lines):
+    """Yields (kind, lines) runs: 'table' for numeric row blocks, 'text' otherwise."""
+    numeric = [len(_NUMBER.findall(line)) >= TABLE_MIN_NUMBERS for line in lines]
+    start = 0
+    while start < len(lines):
+        end = start
+        while end < len(lines) and numeric[end] == numeric[start]:
+            end += 1
+        kind = "table" if numeric[start] and end - start >= TABLE_MIN_ROWS else "text"
+        yield kind, lines[start:end]
+        start = end
+
+
+def chunk_pages(pages, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """
+    Splits page texts into overlapping word windows. Property tables (runs of
+    numeric rows) become their own chunks so their rows are not cut apart.
+    Returns a list of {"page", "kind", "text"} dicts (pages are 1-based).
+    """
+    chunks = []
+    step = max(1, chunk_words - overlap)
+    for page_number, page in enumerate(pages, start=1):
+        words = []
+        for kind, lines in _split_tables([line.strip() for line in page.splitlines() if line.strip()]):
+            if kind == "table":
+                table_words = " ".join(lines).split()
+                for start in range(0, len(table_words), MAX_TABLE_WORDS):
+                    chunks.append({"page": page_number, "kind": "table",
+                                   "text": "\n".join(lines) if len(table_words) <= MAX_TABLE_WORDS
+                                   else " ".join(table_words[start:start + MAX_TABLE_WORDS])})
+            else:
+                words.extend(" ".join(lines).split())
+        for start in range(0, max(len(words) - overlap, 1), step):
+            window = words[start:start + chunk_words]
+            if window:
+                chunks.append({"page": page_number, "kind": "text", "text": " ".join(window)})
+    return chunks
+
+
+class LiteratureIndex:
+    """
+    Persistent BM25 index over paper chunks. Term frequencies are stored as
+    CSR-style NumPy arrays (one row per chunk), so adding a paper appends rows
+    instead of rebuilding the index. Papers are keyed by content hash and are
+    only ingested once.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.generation = None
+        self._dirty = False
+        os.makedirs(path, exist_ok=True)
+        try:
+            self._load()
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("Literature index at %s is unreadable, starting a new one (papers are re-indexed on upload): %s", path, e)
+            self.vocab, self.papers, self.chunks = {}, {}, []
+            self.indptr = np.zeros(1, dtype=np.int64)
+            self.term_ids = np.zeros(0, dtype=np.int32)
+            self.tfs = np.zeros(0, dtype=np.float32)
+        self._refresh_stats()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def _files(self, generation):
+        return (os.path.join(self.path, f"meta-{generation}.json"),
+                os.path.join(self.path, f"postings-{generation}.npz"))
+
+    def _load(self):
+        """Reads the generation named by the manifest; raises ValueError if its two files disagree."""
+        with open(os.path.join(self.path, "manifest.json")) as f:
+            self.generation = json.load(f)["generation"]
+        meta_path, postings_path = self._files(self.generation)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with np.load(postings_path) as arrays:
+            self.indptr = arrays["indptr"]
+            self.term_ids = arrays["term_ids"]
+            self.tfs = arrays["tfs"]
+        self.vocab = meta["vocab"]
+        self.papers = meta["papers"]
+        self.chunks = meta["chunks"]
+        if (len(self.indptr) != len(self.chunks) + 1 or self.indptr[-1] != len(self.term_ids)
+                or len(self.tfs) != len(self.term_ids)
+                or (len(self.term_ids) and self.term_ids.max() >= len(self.vocab))):
+            raise ValueError(f"postings of generation {self.generation} don't match its metadata")
+
+    def _refresh_stats(self):
+        """Chunk id per posting, per-chunk lengths and document frequencies."""
+        self.posting_doc = np.repeat(np.arange(len(self.chunks)), np.diff(self.indptr))
+        self.doc_len = np.bincount(self.posting_doc, weights=self.tfs, minlength=len(self.chunks))
+        self.df = np.bincount(self.term_ids, minlength=len(self.vocab)).astype(np.float64)
+        self._stale = False
+
+    def has_paper(self, digest):
+        return digest in self.papers
+
+    def add_paper(self, name, pdf_bytes=None, pages=None, save=True):
+        """
+        Indexes one paper (PDF bytes or pre-extracted page texts).
+        Returns (digest, new chunk count); already indexed content adds nothing.
+        When adding a batch, pass save=False and call save() once at the end.
+        """
+        digest = hashlib.sha256(pdf_bytes if pdf_bytes is not None else "\f".join(pages).encode()).hexdigest()
+        if self.has_paper(digest):
+            return digest, 0
+        if pages is None:
+            pages = extract_pages(pdf_bytes)
+        new_chunks = chunk_pages(pages)
+
+        with self._lock:
+            if self.has_paper(digest):
+                return digest, 0  # ingested by a concurrent session meanwhile
+            term_ids, tfs, lengths = [], [], []
+            for chunk in new_chunks:
+                tokens = tokenize(chunk["text"])
+                ids = np.array([self.vocab.setdefault(t, len(self.vocab)) for t in tokens], dtype=np.int32)
+                unique, counts = np.unique(ids, return_counts=True)
+                term_ids.append(unique)
+                tfs.append(counts.astype(np.float32))
+                lengths.append(len(unique))
+                chunk.update(paper=digest)
+
+            first = len(self.chunks)
+            self.chunks.extend(new_chunks)
+            self.papers[digest] = {"name": name, "pages": len(pages), "chunks": [first, len(self.chunks)]}
+            if new_chunks:
+                self.term_ids = np.concatenate([self.term_ids, *term_ids])
+                self.tfs = np.concatenate([self.tfs, *tfs])
+                self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)])
+            # Recomputed on the next search, so a batch pays for it once
+            self._stale = True
+            self._dirty = True
+            if save:
+                self._save()
+        return digest, len(new_chunks)
+
+    def save(self):
+        """Writes papers added with save=False (a no-op when nothing changed)."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _save(self):
+        """
+        Writes metadata and postings as a new generation, then points the
+        manifest at it with one atomic rename. A crash at any point leaves the
+        manifest naming a complete, matching pair. Called with the lock held.
+        """
+        previous = self.generation
+        generation = uuid.uuid4().hex[:12]
+        meta_path, postings_path = self._files(generation)
+        with open(meta_path, "w") as f:
+            json.dump({"vocab": self.vocab, "papers": self.papers, "chunks": self.chunks}, f)
+        np.savez(postings_path, indptr=self.indptr, term_ids=self.term_ids, tfs=self.tfs)
+        manifest = os.path.join(self.path, "manifest.json")
+        with open(f"{manifest}.tmp", "w") as f:
+            json.dump({"generation": generation}, f)
+        os.replace(f"{manifest}.tmp", manifest)
+        self.generation = generation
+        self._dirty = False
+        # The previous generation is kept for processes that read the old manifest a moment ago
+        keep = {generation, previous}
+        for path in glob.glob(os.path.join(self.path, "meta-*.json")) + glob.glob(os.path.join(self.path, "postings-*.npz")):
+            if os.path.basename(path).split("-", 1)[1].rsplit(".", 1)[0] not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def search(self, query, top_k=TOP_K, papers=None):
+        """
+        BM25-ranked chunks for a question, optionally limited to some paper digests.
+        Returns chunk dicts with "paper_name" and "score" added.
+        """
+        with self._lock:
+            query_ids = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+            if not query_ids or not len(self):
+                return []
+            if self._stale:
+                self._refresh_stats()
+
+            n = len(self.chunks)
+            idf = np.log(1 + (n - self.df + 0.5) / (self.df + 0.5))
+            hit = np.isin(self.term_ids, query_ids)
+            docs = self.posting_doc[hit]
+            tf = self.tfs[hit]
+            norm = K1 * (1 - B + B * self.doc_len[docs] / max(self.doc_len.mean(), 1e-9))
+            scores = np.bincount(docs, weights=idf[self.term_ids[hit]] * tf * (K1 + 1) / (tf + norm), minlength=n)
+
+        if papers is not None:
+            allowed = np.zeros(n, dtype=bool)
+            for digest in papers:
+                if digest in self.papers:
+                    first, last = self.papers[digest]["chunks"]
+                    allowed[first:last] = True
+            scores = np.where(allowed, scores, 0)
+
+        top = np.argsort(scores)[::-1][:top_k]
+        return [
+            {**self.chunks[i], "paper_name": self.papers[self.chunks[i]["paper"]]["name"], "score": float(scores[i])}
+            for i in top if scores[i] > 0
+        ]
+
+
+def build_context(hits):
+    """Ranked chunks as a numbered excerpt list the model can cite."""
+    return "\n\n".join(
+        f"[{rank}] {hit['paper_name']}, p.{hit['page']}{' (table)' if hit['kind'] == 'table' else ''}:\n{hit['text']}"
+        for rank, hit in enumerate(hits, start=1)
+    )
+
+
+def question_prompt(question, hits):
+    """Prompt that answers a question from retrieved excerpts only."""
+    return (
+        "ACT AS: A Materials Science Literature Analyst. Answer the question using only the excerpts below, "
+        "citing them as [n]. Put extracted property values in a table. If the excerpts do not contain the answer, say so.\n\n"
+        f"QUESTION: {question}\n\nEXCERPTS:\n{build_context(hits)}"
+    )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_literature_index():
+    """Process-wide index shared by every Streamlit session."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LiteratureIndex()
+        return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add a folder of PDFs to the MatNexus literature index.")
+    parser.add_argument("pdf_dir", help="Directory of .pdf papers")
+    parser.add_argument("index_dir", nargs="?", default=INDEX_PATH, help="Index location")
+    args = parser.parse_args()
+
+    index = LiteratureIndex(args.index_dir)
+    for path in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))):
+        try:
+            with open(path, "rb") as f:
+                _, added = index.add_paper(os.path.basename(path), f.read(), save=False)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        print(f"{os.path.basename(path)}: {added} new chunks")
+    index.save()
+    print(f"Index holds {len(index.papers)} papers, {len(index)} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,47 @@
-from mp_api.client import MPRester 
-import os 
+import logging
+
 from dotenv import load_dotenv 
 
+from component.mp_store import get_store
+from component.tracing import span
+
 load_dotenv()
-api_key = os.getenv("MP_API_KEY")
+
+logger = logging.getLogger(__name__)
 
 
 def get_mp_reference(formula):
 
     """
     Fetches the most stable structure for a given formula from the Materials Project database.
+    Answers come from the local reference store; the formula's chemical system is
+    only pulled over the network when it is missing or older than the store TTL.
     """
 
-    try:
-        with MPRester(api_key) as mpr:
-            # Search for the most stable entry - lowest energy 
-            docs = mpr.summary.search(formula=formula, fields=["density", "symmetry", "volume", "material_id"])
+    with span("mp.lookup", formula=formula) as s:
+        try:
+            # Lowest-energy entry (energy above hull, then formation energy)
+            reference = get_store().get_reference(formula)
+            s.set(found=reference is not None)
+            return reference
 
-            if docs:
+        except Exception as e:
+            s.fail(e)
+            logger.warning("MP API Error: %s", e)
+            return None
 
-                # Sort by energy to get most stable entry 
-                stable_entry = docs[0]
 
-                return {
-                    "mp_id" : stable_entry.material_id,
-                    "density": stable_entry.density,
-                    "space_group": stable_entry.symmetry.symbol,
-                    "volume" : stable_entry.volume
-                }
+def prefetch_mp_references(chemsys_list):
+
+    """
+    Warms the local store for several chemical systems (e.g. ["Zn-O", "Ti-O"]) in one request.
+    """
 
-            return None 
+    with span("mp.prefetch", systems=len(chemsys_list)) as s:
+        try:
+            return get_store().prefetch(chemsys_list)
 
-    except Exception as e:
-        print(f"MP API Error: {e}")
-        return None
\ No newline at end of file
+        except Exception as e:
+            s.fail(e)
+            logger.warning("MP API Error: %s", e)
+            return []
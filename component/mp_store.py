@@ -0,0 +1,216 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from pymatgen.core import Composition
+
+logger = logging.getLogger(__name__)
+
+# Default location of the local reference store
+STORE_PATH = os.getenv("MATNEXUS_MP_STORE", os.path.join(".matnexus", "mp_reference.sqlite"))
+
+# Pre-built snapshot used instead of the store when running offline
+SNAPSHOT_PATH = os.getenv("MATNEXUS_MP_SNAPSHOT")
+
+# A chemical system is re-fetched once its cached copy is older than this (seconds)
+TTL_SECONDS = float(os.getenv("MATNEXUS_MP_TTL", str(7 * 24 * 3600)))
+
+# Offline mode never touches the network (tests, air-gapped lab machines)
+OFFLINE = os.getenv("MATNEXUS_MP_OFFLINE", "").lower() in ("1", "true", "yes")
+
+SUMMARY_FIELDS = [
+    "material_id", "formula_pretty", "chemsys", "density", "symmetry",
+    "volume", "energy_above_hull", "formation_energy_per_atom"
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    material_id TEXT PRIMARY KEY,
+    formula TEXT NOT NULL,
+    chemsys TEXT NOT NULL,
+    density REAL,
+    space_group TEXT,
+    volume REAL,
+    energy_above_hull REAL,
+    formation_energy_per_atom REAL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_formula ON entries (formula);
+CREATE INDEX IF NOT EXISTS idx_entries_chemsys ON entries (chemsys);
+CREATE TABLE IF NOT EXISTS fetched (
+    chemsys TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL
+);
+"""
+
+_rester = None
+_rester_lock = threading.Lock()
+
+
+def normalize_formula(formula):
+    """Reduced formula and chemical system ("O-Zn") for any formula string."""
+    composition = Composition(formula)
+    return composition.reduced_formula, composition.chemical_system
+
+
+def _get_rester():
+    """One pooled MPRester session for the whole process instead of one per lookup."""
+    global _rester
+    with _rester_lock:
+        if _rester is None:
+            from mp_api.client import MPRester
+            _rester = MPRester(os.getenv("MP_API_KEY"))
+        return _rester
+
+
+class ReferenceStore:
+    """
+    SQLite-backed local copy of Materials Project summary entries,
+    indexed by reduced formula and chemical system.
+    """
+
+    def __init__(self, path=STORE_PATH, ttl=TTL_SECONDS, offline=OFFLINE):
+        self.path = path
+        self.ttl = ttl
+        self.offline = offline
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def is_fresh(self, chemsys):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at FROM fetched WHERE chemsys = ?", (chemsys,)
+            ).fetchone()
+        return row is not None and time.time() - row["fetched_at"] < self.ttl
+
+    def upsert(self, docs, chemsys_list):
+        """Stores summary docs and marks each requested chemical system as fetched."""
+        rows = []
+        for doc in docs:
+            rows.append((
+                str(doc.material_id),
+                doc.formula_pretty,
+                doc.chemsys,
+                doc.density,
+                doc.symmetry.symbol if doc.symmetry else None,
+                doc.volume,
+                doc.energy_above_hull,
+                doc.formation_energy_per_atom,
+            ))
+        now = time.time()
+        with self._lock, self._conn:
+            # Replace whole systems so entries withdrawn upstream disappear locally too
+            self._conn.executemany(
+                "DELETE FROM entries WHERE chemsys = ?", [(c,) for c in chemsys_list]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fetched VALUES (?, ?)", [(c, now) for c in chemsys_list]
+            )
+
+    def prefetch(self, chemsys_list, force=False):
+        """
+        Pulls every entry of the given chemical systems in a single request.
+        Systems that are still fresh are skipped unless force=True.
+        Returns the list of systems that were actually fetched.
+        """
+        wanted = sorted({Composition(c.replace("-", "")).chemical_system for c in chemsys_list})
+        if not force:
+            wanted = [c for c in wanted if not self.is_fresh(c)]
+        if not wanted or self.offline:
+            return []
+
+        docs = _get_rester().summary.search(chemsys=wanted, fields=SUMMARY_FIELDS)
+        self.upsert(docs, wanted)
+        return wanted
+
+    def lookup(self, formula):
+        """
+        Lowest-energy stored entry for a formula (by energy above hull,
+        then formation energy), or None if the store has no match.
+        """
+        reduced, _ = normalize_formula(formula)
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT * FROM entries WHERE formula = ?
+                ORDER BY energy_above_hull IS NULL, energy_above_hull,
+                         formation_energy_per_atom IS NULL, formation_energy_per_atom
+                LIMIT 1
+                """,
+                (reduced,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "mp_id": row["material_id"],
+            "density": row["density"],
+            "space_group": row["space_group"],
+            "volume": row["volume"],
+            "energy_above_hull": row["energy_above_hull"]
+        }
+
+    def get_reference(self, formula):
+        """
+        Lookup that refreshes the formula's chemical system first when stale.
+        If the refresh fails (no network, MP down), the stored entry is served
+        as is; the error is only raised when there is nothing stored to fall back on.
+        """
+        _, chemsys = normalize_formula(formula)
+        try:
+            self.prefetch([chemsys])
+        except Exception as e:
+            reference = self.lookup(formula)
+            if reference is None:
+                raise
+            logger.warning("Refreshing %s failed, serving the stored entry: %s", chemsys, e)
+            return reference
+        return self.lookup(formula)
+
+    def export_snapshot(self, path):
+        """Writes a consistent copy of the store that can be shipped for offline use."""
+        target = sqlite3.connect(path)
+        try:
+            with self._lock:
+                self._conn.backup(target)
+        finally:
+            target.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Process-wide reference store. Offline runs open the pre-built snapshot
+    (MATNEXUS_MP_SNAPSHOT) when one is configured.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if OFFLINE and SNAPSHOT_PATH:
+                _store = ReferenceStore(SNAPSHOT_PATH, offline=True)
+            else:
+                _store = ReferenceStore()
+        return _store
+
+
+def build_snapshot(chemsys_list, path):
+    """Fetches the given chemical systems and saves them as an offline snapshot."""
+    store = get_store()
+    store.prefetch(chemsys_list, force=True)
+    store.export_snapshot(path)
@@ -0,0 +1,232 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+from scipy.ndimage import gaussian_filter1d
+
+from component.xrd_engine import simulate_patterns
+
+logger = logging.getLogger(__name__)
+
+# Index the app searches (build it with `python -m component.phase_search <cif_dir>`)
+INDEX_PATH = os.getenv("MATNEXUS_PHASE_INDEX", os.path.join(".matnexus", "phase_index"))
+
+# Fine 2θ grid used for the broadened fingerprints
+TWO_THETA_MIN = 10.0
+TWO_THETA_MAX = 80.0
+STEP = 0.05
+
+# Gaussian broadening (FWHM, degrees) so small peak shifts still overlap
+FWHM = 0.3
+
+# Coarse presence bins used by the prefilter, and the relative height a peak needs to count
+COARSE_STEP = 1.0
+COARSE_THRESHOLD = 5.0
+
+# Number of strongest peaks stored per phase for reporting matches
+N_PEAKS = 10
+
+# Patterns simulated per batch while building an index
+BUILD_BATCH = 256
+
+
+def _grid():
+    return np.arange(TWO_THETA_MIN, TWO_THETA_MAX + STEP / 2, STEP)
+
+
+def fingerprints(patterns):
+    """
+    Turns (two_theta, intensity) pairs into L2-normalized, broadened profiles on
+    the fine grid. Intensities are square-rooted so weak lines still count.
+    Returns a float32 array of shape (len(patterns), n_bins).
+    """
+    n_bins = len(_grid())
+    sticks = np.zeros((len(patterns), n_bins), dtype=np.float32)
+    for row, (two_theta, intensity) in enumerate(patterns):
+        two_theta = np.asarray(two_theta, dtype=float)
+        intensity = np.asarray(intensity, dtype=float)
+        keep = (two_theta >= TWO_THETA_MIN) & (two_theta <= TWO_THETA_MAX)
+        bins = np.round((two_theta[keep] - TWO_THETA_MIN) / STEP).astype(int)
+        np.add.at(sticks[row], np.clip(bins, 0, n_bins - 1), np.sqrt(intensity[keep]))
+
+    sigma = FWHM / (2 * np.sqrt(2 * np.log(2))) / STEP
+    profiles = gaussian_filter1d(sticks, sigma, axis=1, mode="constant")
+    norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+    return profiles / np.where(norms > 0, norms, 1)
+
+
+def coarse_fingerprints(patterns):
+    """Normalized peak-presence vectors on 1° bins for the cheap prefilter."""
+    n_bins = int(np.ceil((TWO_THETA_MAX - TWO_THETA_MIN) / COARSE_STEP))
+    coarse = np.zeros((len(patterns), n_bins), dtype=np.float32)
+    for row, (two_theta, intensity) in enumerate(patterns):
+        two_theta = np.asarray(two_theta, dtype=float)
+        intensity = np.asarray(intensity, dtype=float)
+        if intensity.size == 0:
+            continue
+        keep = (two_theta >= TWO_THETA_MIN) & (two_theta < TWO_THETA_MAX) & (
+            intensity >= COARSE_THRESHOLD / 100 * intensity.max()
+        )
+        bins = ((two_theta[keep] - TWO_THETA_MIN) // COARSE_STEP).astype(int)
+        coarse[row, bins] = 1.0
+    norms = np.linalg.norm(coarse, axis=1, keepdims=True)
+    return coarse / np.where(norms > 0, norms, 1)
+
+
+def peak_table(patterns):
+    """Positions of the N_PEAKS strongest lines per pattern, NaN-padded."""
+    table = np.full((len(patterns), N_PEAKS), np.nan, dtype=np.float32)
+    for row, (two_theta, intensity) in enumerate(patterns):
+        two_theta = np.asarray(two_theta, dtype=float)
+        intensity = np.asarray(intensity, dtype=float)
+        keep = (two_theta >= TWO_THETA_MIN) & (two_theta <= TWO_THETA_MAX)
+        two_theta, intensity = two_theta[keep], intensity[keep]
+        strongest = np.sort(two_theta[np.argsort(intensity)[::-1][:N_PEAKS]])
+        table[row, :len(strongest)] = strongest
+    return table
+
+
+def build_index(entries, path, wavelength="CuKa"):
+    """
+    Simulates every reference structure and writes the fingerprint index to `path`.
+    `entries` is an iterable of (phase_id, structure) pairs.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta, profiles, coarse, peaks = [], [], [], []
+
+    batch = []
+    def flush():
+        patterns = simulate_patterns([s for _, s in batch], wavelength=wavelength)
+        profiles.append(fingerprints(patterns))
+        coarse.append(coarse_fingerprints(patterns))
+        peaks.append(peak_table(patterns))
+        for phase_id, structure in batch:
+            meta.append({"id": phase_id, "formula": structure.composition.reduced_formula})
+        batch.clear()
+
+    for phase_id, structure in entries:
+        batch.append((phase_id, structure))
+        if len(batch) >= BUILD_BATCH:
+            flush()
+    if batch:
+        flush()
+
+    n_bins = len(_grid())
+    np.save(os.path.join(path, "profiles.npy"), np.concatenate(profiles) if profiles else np.zeros((0, n_bins), np.float32))
+    np.save(os.path.join(path, "coarse.npy"), np.concatenate(coarse) if coarse else np.zeros((0, 1), np.float32))
+    np.save(os.path.join(path, "peaks.npy"), np.concatenate(peaks) if peaks else np.zeros((0, N_PEAKS), np.float32))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({
+            "wavelength": wavelength,
+            "grid": [TWO_THETA_MIN, TWO_THETA_MAX, STEP],
+            "fwhm": FWHM,
+            "phases": meta
+        }, f)
+    return PhaseIndex(path)
+
+
+class PhaseIndex:
+    """
+    Memory-mapped fingerprint index answering top-k phase queries from a peak list.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["grid"] != [TWO_THETA_MIN, TWO_THETA_MAX, STEP]:
+            raise ValueError("Index was built with a different 2θ grid; rebuild it.")
+        self.phases = self.meta["phases"]
+        self.profiles = np.load(os.path.join(path, "profiles.npy"), mmap_mode="r")
+        self.coarse = np.load(os.path.join(path, "coarse.npy"), mmap_mode="r")
+        self.peaks = np.load(os.path.join(path, "peaks.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.phases)
+
+    def query(self, two_theta, intensity=None, top_k=5, prefilter=500, tolerance=0.3):
+        """
+        Ranks reference phases against an experimental peak list.
+        The coarse prefilter keeps `prefilter` candidates, which are then scored
+        by cosine similarity of the broadened profiles.
+        Returns dicts with id, formula, score and matched peak count; empty when
+        there are no peaks or nothing overlaps them (zero-score phases are dropped).
+        """
+        two_theta = np.asarray(two_theta, dtype=float)
+        if len(self) == 0 or len(two_theta) == 0:
+            return []
+        intensity = np.full(two_theta.shape, 100.0) if intensity is None else np.asarray(intensity, dtype=float)
+        pattern = [(two_theta, intensity)]
+
+        coarse_scores = self.coarse @ coarse_fingerprints(pattern)[0]
+        if len(self) > prefilter:
+            candidates = np.argpartition(coarse_scores, -prefilter)[-prefilter:]
+        else:
+            candidates = np.arange(len(self))
+        candidates = np.sort(candidates)  # sorted rows read the memmap sequentially
+
+        scores = self.profiles[candidates] @ fingerprints(pattern)[0]
+        order = np.argsort(scores)[::-1][:top_k]
+
+        # Experimental peaks that sit within `tolerance` of a reference line
+        reference_peaks = np.asarray(self.peaks[candidates[order]])
+        distance = np.abs(reference_peaks[:, :, None] - two_theta[None, None, :])
+        matched = np.sum(np.min(np.where(np.isnan(distance), np.inf, distance), axis=1) <= tolerance, axis=1)
+
+        results = []
+        for rank, row in enumerate(candidates[order]):
+            if scores[order[rank]] <= 0:
+                break  # ranked by score, so the rest share nothing with the peaks either
+            phase = self.phases[row]
+            results.append({
+                "id": phase["id"],
+                "formula": phase["formula"],
+                "score": float(scores[order[rank]]),
+                "matched_peaks": int(matched[rank]),
+                "reference_peaks": [float(p) for p in reference_peaks[rank] if not np.isnan(p)]
+            })
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_phase_index():
+    """
+    Process-wide index at INDEX_PATH, or None when no index has been built there.
+    A missing index is checked again on the next call, so building one needs no restart.
+    """
+    global _index
+    with _index_lock:
+        if _index is None and os.path.exists(os.path.join(INDEX_PATH, "meta.json")):
+            _index = PhaseIndex(INDEX_PATH)
+        return _index
+
+
+def _read_cif_dir(cif_dir):
+    from component.structure_cache import get_structure
+    for path in sorted(glob.glob(os.path.join(cif_dir, "*.cif"))):
+        try:
+            with open(path) as f:
+                yield os.path.splitext(os.path.basename(path))[0], get_structure(f.read())
+        except Exception as e:
+            logger.warning("Skipping %s: %s", path, e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the MatNexus XRD search-match index from a folder of CIFs.")
+    parser.add_argument("cif_dir", help="Directory of reference .cif files")
+    parser.add_argument("index_dir", nargs="?", default=INDEX_PATH, help="Where to write the index")
+    parser.add_argument("--wavelength", default="CuKa")
+    args = parser.parse_args()
+    index = build_index(_read_cif_dir(args.cif_dir), args.index_dir, wavelength=args.wavelength)
+    print(f"Indexed {len(index)} phases into {args.index_dir}")
+
+
+if __name__ == "__main__":
+    main()
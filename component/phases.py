@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Worker processes for per-phase analysis
+PHASE_WORKERS = int(os.getenv("MATNEXUS_PHASE_WORKERS", "4"))
+
+# Peak width (degrees 2θ, Gaussian sigma) used to compare simulated lines with a measured trace
+PROFILE_SIGMA = 0.15
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def analyze_phase(phase, material_class="Unknown"):
+    """
+    Everything the workspace shows for one phase: metrics, sanity warnings,
+    MP reference and simulated XRD lines. Runs in a worker process, so it only
+    takes and returns picklable values.
+    """
+    from component.physics_engine import analyze_structure, validate_results
+    from component.mp_client import get_mp_reference
+    from component.simulator import simulate_xrd_pattern
+
+    result = {"name": phase["name"], "cif": phase["cif"]}
+    metrics = analyze_structure(phase["cif"])
+    result["metrics"] = metrics
+    if "error" in metrics:
+        return result
+
+    result["warnings"] = validate_results(metrics, material_class)
+    result["mp_ref"] = get_mp_reference(metrics["formula"])
+    try:
+        two_theta, intensity = simulate_xrd_pattern(phase["cif"])
+        result["xrd"] = {"two_theta": two_theta.tolist(), "intensity": intensity.tolist()}
+    except Exception as e:
+        result["xrd_error"] = str(e)
+    return result
+
+
+def _get_pool(workers):
+    """One long-lived pool, so the pymatgen import cost is paid once per worker, not per run."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that holds Streamlit threads and SQLite handles is unsafe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _unique_phases(phases):
+    """
+    Phases grouped by identical CIF content: [(first phase, [indices])].
+    Only exact repeats share a result; near-matches are analyzed on their own.
+    """
+    from component.structure_cache import cif_hash
+
+    groups = {}
+    for i, phase in enumerate(phases):
+        groups.setdefault(cif_hash(phase["cif"]), (phase, []))[1].append(i)
+    return list(groups.values())
+
+
+def analyze_phases(phases, material_class="Unknown", workers=PHASE_WORKERS):
+    """
+    Runs analyze_phase once per distinct CIF among the {"name", "cif"}
+    phases, in parallel worker processes when there is more than one.
+    Results come back in input order; a repeated CIF gets a copy of its
+    first phase's result with "duplicate_of" set, and a phase whose worker
+    failed gets {"metrics": {"error": ...}}.
+    """
+    unique = _unique_phases(phases)
+    if len(unique) <= 1 or workers <= 1:
+        analyzed = [analyze_phase(phase, material_class) for phase, _ in unique]
+    else:
+        pool = _get_pool(workers)
+        futures = [pool.submit(analyze_phase, phase, material_class) for phase, _ in unique]
+        analyzed = []
+        for (phase, _), future in zip(unique, futures):
+            try:
+                analyzed.append(future.result())
+            except Exception as e:
+                analyzed.append({"name": phase["name"], "cif": phase["cif"], "metrics": {"error": str(e)}})
+
+    results = [None] * len(phases)
+    for result, (_, indices) in zip(analyzed, unique):
+        results[indices[0]] = result
+        for i in indices[1:]:
+            results[i] = {**result, "name": phases[i]["name"], "cif": phases[i]["cif"], "duplicate_of": result["name"]}
+    return results
+
+
+def _profile(two_theta_grid, lines, sigma=PROFILE_SIGMA):
+    """Simulated stick pattern broadened with Gaussians onto a 2θ grid."""
+    positions = np.asarray(lines["two_theta"])[:, None]
+    heights = np.asarray(lines["intensity"])[:, None]
+    return (heights * np.exp(-0.5 * ((two_theta_grid[None, :] - positions) / sigma) ** 2)).sum(axis=0)
+
+
+def phase_fractions(phase_results, two_theta=None, intensity=None):
+    """
+    Share of the diffraction pattern explained by each phase (a semi-quantitative
+    estimate, not a Rietveld weight fraction).
+    With a measured trace, the broadened simulated patterns are fitted to it by
+    non-negative least squares; otherwise every analyzed phase gets an equal share.
+    Returns {phase name: fraction} over the phases that have simulated lines;
+    names must be unique labels, as extract_cifs returns them.
+    """
+    usable = [p for p in phase_results if p.get("xrd") and len(p["xrd"]["two_theta"])]
+    if not usable:
+        return {}
+    if two_theta is None or intensity is None or len(two_theta) == 0:
+        return {p["name"]: 1 / len(usable) for p in usable}
+
+    from scipy.optimize import nnls
+
+    grid = np.asarray(two_theta, dtype=float)
+    basis = np.stack([_profile(grid, p["xrd"]) for p in usable], axis=1)
+    scales, _ = nnls(basis, np.asarray(intensity, dtype=float))
+    contribution = scales * basis.sum(axis=0)
+    total = contribution.sum()
+    if total <= 0:
+        return {p["name"]: 0.0 for p in usable}
+    return {p["name"]: float(c / total) for p, c in zip(usable, contribution)}
@@ -1,40 +1,20 @@
-from pymatgen.core import Structure
-from pymatgen.io.cif import CifParser
-from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+from component.structure_cache import get_entry
+from component.structure_index import canonical_cif
 
 def analyze_structure(cif_string):
     """
     Parses a CIF string and returns a dictionary of physical properties.
     Now includes lattice parameters and crystal system identification.
+    Parsing and symmetry detection are served from the shared structure cache;
+    a structure that is the same cell as one analyzed before reuses its metrics.
     """
     try:
-        # 1. Initialize the CifParser from the string provided by Gemini
-        parser = CifParser.from_str(cif_string)
-        
-        # 2. Get the structure object (taking the first structure in the CIF)
-        structure = parser.get_structures()[0]
-        
-        # 3. Use SpacegroupAnalyzer for advanced symmetry info
+        # 1. Look up (or parse once) the structure for this CIF text, or its representative
+        entry = get_entry(canonical_cif(cif_string))
+
+        # 2. Symmetry + lattice metrics, computed once per structure
         # symprec=0.1 is a standard tolerance for AI-generated structures
-        analyzer = SpacegroupAnalyzer(structure, symprec=0.1)
-        
-        # 4. Extract the physical metrics
-        lattice = structure.lattice
-        
-        return {
-            "density": structure.density,
-            "volume": structure.volume,
-            "space_group": analyzer.get_space_group_symbol(),
-            "crystal_system": analyzer.get_crystal_system(),
-            "formula": structure.composition.reduced_formula,
-            # Adding lattice constants for more scientific detail
-            "a": lattice.a,
-            "b": lattice.b,
-            "c": lattice.c,
-            "alpha": lattice.alpha,
-            "beta": lattice.beta,
-            "gamma": lattice.gamma
-        }
+        return entry.metrics(symprec=0.1)
     except Exception as e:
         # Return the error so the app can display a helpful warning instead of crashing
         return {"error": str(e)}
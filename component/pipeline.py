@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from component.tracing import span
+
+# Shared pool for work started before its pipeline is built (see prestart)
+_prestart_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="matnexus-prestart")
+
+
+def prestart(func, *args, **kwargs):
+    """
+    Starts `func` right away on a shared thread pool and returns its future,
+    e.g. to begin structure analysis while the model is still streaming prose.
+    The caller's trace context travels with it.
+    """
+    return _prestart_pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def from_future(future):
+    """Stage function that waits for work already started with prestart()."""
+    return lambda **_: future.result()
+
+
+class Stage:
+    """
+    One unit of work in a discovery run.
+    `func` receives the values of its dependencies as keyword arguments
+    named after the dependency stages. `cancel` is an optional threading.Event
+    that is set when the stage times out, for work that can stop early.
+    """
+
+    def __init__(self, name, func, deps=(), timeout=None, cancel=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.cancel = cancel
+
+
+class StageResult:
+    """Outcome of a stage: status is 'ok', 'error', 'timeout' or 'skipped'."""
+
+    def __init__(self, name, status, value=None, error=None, seconds=0.0):
+        self.name = name
+        self.status = status
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+
+def _check_graph(stages, inputs):
+    names = {stage.name for stage in stages} | set(inputs)
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in names]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stage(s): {missing}")
+
+    # Kahn's algorithm: every stage must become runnable eventually
+    pending = {stage.name: set(stage.deps) - set(inputs) for stage in stages}
+    while pending:
+        ready = [name for name, deps in pending.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+        for name in ready:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+
+
+def _run_stage(stage, kwargs):
+    with span(f"stage.{stage.name}"):
+        return stage.func(**kwargs)
+
+
+async def _run_graph(stages, inputs, on_complete, pool):
+    loop = asyncio.get_running_loop()
+    results = {name: StageResult(name, "ok", value) for name, value in inputs.items()}
+    tasks = {}
+
+    async def run_stage(stage):
+        # Wait for every dependency; a failed dependency skips this stage
+        for dep in stage.deps:
+            if dep in tasks:
+                await asyncio.shield(tasks[dep])
+        failed = [dep for dep in stage.deps if not results[dep].ok]
+        if failed:
+            result = StageResult(stage.name, "skipped", error=f"dependency failed: {', '.join(failed)}")
+        else:
+            kwargs = {dep: results[dep].value for dep in stage.deps}
+            started = time.perf_counter()
+            # Pool threads don't inherit contextvars; copy them so stage spans join the run's trace
+            context = contextvars.copy_context()
+            future = loop.run_in_executor(pool, context.run, _run_stage, stage, kwargs)
+            try:
+                value = await asyncio.wait_for(future, timeout=stage.timeout)
+                result = StageResult(stage.name, "ok", value, seconds=time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                # The worker thread cannot be killed: ask it to stop, and discard its late result
+                if stage.cancel is not None:
+                    stage.cancel.set()
+                result = StageResult(stage.name, "timeout", error=f"timed out after {stage.timeout}s",
+                                     seconds=time.perf_counter() - started)
+            except Exception as e:
+                result = StageResult(stage.name, "error", error=str(e), seconds=time.perf_counter() - started)
+
+        results[stage.name] = result
+        if on_complete:
+            # Runs on the event-loop thread, i.e. the thread that called run_pipeline
+            outcome = on_complete(stage.name, result)
+            if inspect.isawaitable(outcome):
+                await outcome
+        return result
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+    await asyncio.gather(*tasks.values())
+    return results
+
+
+def run_pipeline(stages, inputs=None, on_complete=None, max_workers=4):
+    """
+    Executes a dependency graph of stages, starting each one on a thread pool as
+    soon as its dependencies have finished. `on_complete(name, result)` fires in
+    the calling thread as each stage finishes, so UI code can render progressively.
+    Returns a dict of stage name -> StageResult.
+    """
+    inputs = dict(inputs or {})
+    _check_graph(stages, inputs)
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="matnexus-stage")
+    try:
+        return asyncio.run(_run_graph(stages, inputs, on_complete, pool))
+    finally:
+        # Don't block on threads still running past their timeout
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,357 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from component.tracing import get_tracer, span
+
+# Where cached model responses are stored
+CACHE_DIR = os.getenv("MATNEXUS_RESPONSE_CACHE_DIR", os.path.join(".matnexus", "response_cache"))
+
+# Eviction bounds: total size on disk and maximum age of an entry
+MAX_BYTES = int(float(os.getenv("MATNEXUS_RESPONSE_CACHE_MB", "200")) * 1024 * 1024)
+MAX_AGE_SECONDS = float(os.getenv("MATNEXUS_RESPONSE_CACHE_DAYS", "7")) * 24 * 3600
+
+USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "thoughts_token_count", "total_token_count")
+
+
+def _hash_part(digest, part):
+    """Feeds one element of `contents` into the request hash."""
+    if isinstance(part, str):
+        digest.update(b"text:" + part.encode("utf-8"))
+    elif isinstance(part, (bytes, bytearray)):
+        digest.update(b"bytes:" + hashlib.sha256(part).digest())
+    elif hasattr(part, "tobytes") and hasattr(part, "mode"):
+        # PIL image: hash the decoded pixels so re-opening the same upload hits
+        digest.update(f"image:{part.mode}:{part.size}:".encode())
+        digest.update(hashlib.sha256(part.tobytes()).digest())
+    elif getattr(part, "inline_data", None) is not None:
+        digest.update(f"blob:{part.inline_data.mime_type}:".encode())
+        digest.update(hashlib.sha256(part.inline_data.data).digest())
+    elif getattr(part, "uri", None) or getattr(part, "sha256_hash", None):
+        # Files API handle: its content hash identifies the document
+        digest.update(f"file:{getattr(part, 'sha256_hash', None) or part.uri}".encode())
+    elif isinstance(part, (list, tuple)):
+        for item in part:
+            _hash_part(digest, item)
+    else:
+        digest.update(b"repr:" + repr(part).encode("utf-8"))
+
+
+def request_key(model, contents, config=None):
+    """Hash of the model name, prompt text and the content of every attachment."""
+    digest = hashlib.sha256(f"model:{model}\n".encode())
+    if not isinstance(contents, (list, tuple)):
+        contents = [contents]
+    for part in contents:
+        _hash_part(digest, part)
+    if config is not None:
+        digest.update(b"config:" + repr(config).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CachedResponse:
+    """Stand-in for a generate_content response replayed from the cache."""
+
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(**usage) if usage else None
+        self.from_cache = True
+
+
+def _usage_dict(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, None) for field in USAGE_FIELDS}
+
+
+class ResponseCache:
+    """
+    Disk-backed response store with size/age eviction and single-flight:
+    concurrent callers asking for the same key share one upstream call.
+    """
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES, max_age=MAX_AGE_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._streams = {}
+        self.stats = {"hits": 0, "misses": 0, "shared": 0}
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                return None
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)  # mtime doubles as last-access time for eviction
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(entry["text"], entry.get("usage"))
+
+    def put(self, key, model, response):
+        entry = {"model": model, "text": response.text, "usage": _usage_dict(response), "created": time.time()}
+        temp_path = f"{self._file(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._file(key))
+        except OSError:
+            return
+        self._evict()
+
+    def _evict(self):
+        """Drops expired entries, then the least recently used ones until under max_bytes."""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _join_or_lead(self, flights, key, new_flight):
+        """
+        Under the lock: (cached response, None, False) when the answer has been
+        stored meanwhile, else (None, flight, leader). A leader stores its answer
+        before closing its flight, so a caller whose first cache check raced that
+        store finds it here instead of starting a second upstream call.
+        """
+        with self._lock:
+            flight = flights.get(key)
+            if flight is not None:
+                self.stats["shared"] += 1
+                return None, flight, False
+            cached = self.get(key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                return cached, None, False
+            flight = flights[key] = new_flight()
+            self.stats["misses"] += 1
+            return None, flight, True
+
+    def get_or_call(self, key, model, call):
+        cached = self.get(key)
+        if cached is not None:
+            self._count("hits")
+            return cached
+
+        cached, flight, leader = self._join_or_lead(
+            self._in_flight, key, lambda: {"done": threading.Event(), "response": None, "error": None}
+        )
+        if cached is not None:
+            return cached
+
+        if not leader:
+            # Someone is already asking the model the same thing: wait for their answer
+            flight["done"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            return flight["response"]
+
+        try:
+            response = call()
+            flight["response"] = response
+            if getattr(response, "text", None) is not None:
+                self.put(key, model, response)
+            return response
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight["done"].set()
+
+    def stream_or_call(self, key, model, call):
+        """
+        Streaming get_or_call. Yields (chunk, source) pairs, where source is
+        "cache" (the whole answer as one chunk), "upstream" (this caller runs
+        `call()`, a chunk iterator) or "shared" (replay of a concurrent leader's
+        chunks as they arrive). The joined text is cached when the stream ends.
+        """
+        cached = self.get(key)
+        if cached is None:
+            cached, flight, leader = self._join_or_lead(
+                self._streams, key,
+                lambda: {"chunks": [], "finished": False, "error": None, "cond": threading.Condition()}
+            )
+        else:
+            self._count("hits")
+        if cached is not None:
+            yield cached, "cache"
+            return
+
+        if not leader:
+            sent = 0
+            while True:
+                with flight["cond"]:
+                    flight["cond"].wait_for(lambda: len(flight["chunks"]) > sent or flight["finished"])
+                    pending = flight["chunks"][sent:]
+                    finished, error = flight["finished"], flight["error"]
+                for chunk in pending:
+                    yield chunk, "shared"
+                sent += len(pending)
+                if finished and sent == len(flight["chunks"]):
+                    if error is not None:
+                        raise error
+                    return
+
+        texts = []
+        last = None
+        complete = False
+        upstream = call()
+        try:
+            for chunk in upstream:
+                if chunk.text:
+                    texts.append(chunk.text)
+                last = chunk
+                with flight["cond"]:
+                    flight["chunks"].append(chunk)
+                    flight["cond"].notify_all()
+                yield chunk, "upstream"
+            complete = True
+            if last is not None:
+                # Cached before the flight closes, so a caller arriving now hits the cache
+                # (usage totals arrive on the final chunk)
+                self.put(key, model, CachedResponse("".join(texts), _usage_dict(last)))
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            if not complete and flight["error"] is None:
+                # The leader stopped reading (e.g. a cancelled stage); waiters must not hang
+                flight["error"] = RuntimeError("Shared model stream was abandoned before it finished")
+                close = getattr(upstream, "close", None)
+                if close:
+                    close()
+            with self._lock:
+                del self._streams[key]
+            with flight["cond"]:
+                flight["finished"] = True
+                flight["cond"].notify_all()
+
+
+class _CachedModels:
+    def __init__(self, models, cache):
+        self._models = models
+        self._cache = cache
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        with span("gemini.generate_content", model=model) as s:
+            key = request_key(model, contents, config)
+            response = self._cache.get_or_call(
+                key, model,
+                lambda: self._models.generate_content(model=model, contents=contents, config=config, **kwargs)
+            )
+            cached = getattr(response, "from_cache", False)
+            s.set(cached=cached)
+            if not cached:
+                # Replayed answers cost no tokens
+                s.record_usage(getattr(response, "usage_metadata", None))
+            return response
+
+    def generate_content_stream(self, model, contents, config=None, **kwargs):
+        """
+        Streaming variant: a cached answer comes back as a single chunk; a request
+        already streaming for another caller is replayed chunk by chunk; otherwise
+        upstream chunks are passed through and the joined text is cached once the
+        stream has been read to the end.
+        """
+        key = request_key(model, contents, config)
+        # Not a context manager: the consumer runs its own spans between chunks
+        tracer = get_tracer()
+        s = tracer.start_span("gemini.generate_content_stream", model=model)
+        last = None
+        source = None
+        try:
+            for chunk, source in self._cache.stream_or_call(
+                key, model,
+                lambda: self._models.generate_content_stream(model=model, contents=contents, config=config, **kwargs)
+            ):
+                if last is None:
+                    s.set(first_chunk_seconds=round(s.elapsed(), 3))
+                last = chunk
+                yield chunk
+        except Exception as e:
+            s.fail(e)
+            raise
+        finally:
+            s.set(cached=source != "upstream", shared=source == "shared")
+            if source == "upstream":
+                # Replayed answers cost no tokens
+                s.record_usage(getattr(last, "usage_metadata", None))
+            tracer.finish(s)
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+class CachedClient:
+    """
+    Wraps a genai.Client so identical generate_content (and generate_content_stream)
+    calls are answered from the cache.
+    """
+
+    def __init__(self, client, cache=None):
+        self._client = client
+        self.cache = cache or get_response_cache()
+        self.models = _CachedModels(client.models, self.cache)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide cache, so single-flight also spans Streamlit reruns and sessions."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+def cache_responses(client, cache=None):
+    """Returns the client wrapped in the response cache (None stays None)."""
+    if client is None or isinstance(client, CachedClient):
+        return client
+    return CachedClient(client, cache or get_response_cache())
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Local store of past discovery runs
+HISTORY_PATH = os.getenv("MATNEXUS_RUN_HISTORY", os.path.join(".matnexus", "runs.sqlite"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    workspace_id TEXT,
+    created_at REAL NOT NULL,
+    material_class TEXT,
+    formula TEXT,
+    analysis_text TEXT,
+    cif TEXT,
+    metrics TEXT,
+    mp_ref TEXT,
+    dft_text TEXT,
+    report TEXT,
+    xrd_png BLOB,
+    phases TEXT,
+    xrd_match TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_created ON runs (created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_workspace ON runs (workspace_id, created_at);
+"""
+
+_JSON_FIELDS = ("metrics", "mp_ref", "phases", "xrd_match")
+_FIELDS = (
+    "material_class", "formula", "analysis_text", "cif", "metrics", "mp_ref", "dft_text", "report", "xrd_png",
+    "phases", "xrd_match"
+)
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def new_workspace_id():
+    """Unguessable ID that scopes a browser's run history."""
+    return uuid.uuid4().hex
+
+
+class RunHistory:
+    """
+    SQLite store of finished discovery runs: the CIF, metrics, MP reference,
+    model texts, report markdown, rendered XRD image, multi-phase results and
+    experiment peak matches, keyed by run ID.
+    Every run belongs to a workspace, and reads only see the caller's workspace,
+    so sessions sharing the server never see each other's runs.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def save(self, run, workspace_id):
+        """Stores a run dict (see _FIELDS) in a workspace and returns its run ID."""
+        run_id = run.get("run_id") or new_run_id()
+        values = []
+        for field in _FIELDS:
+            value = run.get(field)
+            if field in _JSON_FIELDS and value is not None:
+                value = json.dumps(value, default=str)
+            values.append(value)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO runs (run_id, workspace_id, created_at, {', '.join(_FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(_FIELDS))})",
+                (run_id, workspace_id, run.get("created_at", time.time()), *values)
+            )
+        return run_id
+
+    def load(self, run_id, workspace_id):
+        """Full run dict, or None if the ID is unknown in this workspace."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM runs WHERE run_id = ? AND workspace_id = ?", (run_id, workspace_id)
+            ).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        for field in _JSON_FIELDS:
+            if run[field] is not None:
+                run[field] = json.loads(run[field])
+        return run
+
+    def list_runs(self, workspace_id, limit=25):
+        """Most recent runs of a workspace first, without the heavy artifact columns."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id, created_at, material_class, formula FROM runs "
+                "WHERE workspace_id = ? ORDER BY created_at DESC LIMIT ?",
+                (workspace_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, run_id, workspace_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM runs WHERE run_id = ? AND workspace_id = ?", (run_id, workspace_id))
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_run_history():
+    """Process-wide run store; each Streamlit session reads only its own workspace."""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = RunHistory()
+        return _history
@@ -1,43 +1,185 @@
-import matplotlib.pyplot as plt
-from pymatgen.core import Structure
-from pymatgen.io.cif import CifParser
-from pymatgen.analysis.diffraction.xrd import XRDCalculator
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.figure import Figure
+from component.structure_cache import cif_hash, get_structure
+from component.structure_index import canonical_cif
+from component.tracing import span, traced
+from component.xrd_engine import simulate_patterns
+
+logger = logging.getLogger(__name__)
+
+# Simulated patterns and rendered PNGs kept in memory (least recently used are dropped first)
+PATTERN_CACHE_SIZE = int(os.getenv("MATNEXUS_PATTERN_CACHE_SIZE", "128"))
+RENDER_CACHE_SIZE = int(os.getenv("MATNEXUS_RENDER_CACHE_SIZE", "64"))
+
+# Experimental traces are decimated to about this many points before plotting
+MAX_TRACE_POINTS = 2000
+
+PHASE_COLORS = ("red", "royalblue", "darkorange", "seagreen", "purple", "saddlebrown")
+
+_lock = threading.Lock()
+_patterns = OrderedDict()
+_renders = OrderedDict()
+
+def _cache_get(cache, key):
+    with _lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    return None
+
+def _cache_put(cache, key, value, size):
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+def clear_render_cache():
+    """Drops cached patterns and rendered images."""
+    with _lock:
+        _patterns.clear()
+        _renders.clear()
+
+def simulate_xrd_pattern(cif_string, wavelength="CuKa"):
+    """
+    Calculates the theoretical XRD pattern (2θ, intensity arrays) from a CIF string.
+    Results are cached per structure hash and wavelength; a structure that is
+    the same cell as an earlier one shares its representative's pattern.
+    """
+    cif_string = canonical_cif(cif_string)
+    key = (cif_hash(cif_string), str(wavelength))
+    cached = _cache_get(_patterns, key)
+    if cached is not None:
+        return cached
+
+    # 1. Get the Pymatgen Structure object (parsed once, shared via the structure cache)
+    structure = get_structure(cif_string)
+
+    # 2. Run the batched XRD engine (Cu K-alpha radiation by default)
+    # wavelength=1.5406 angstroms is standard for lab XRD
+    with span("xrd.simulate", sites=len(structure)) as s:
+        two_theta, intensity = simulate_patterns([structure], wavelength=wavelength)[0]
+        s.set(peaks=len(two_theta))
+    # Shared through the cache, so callers get read-only views
+    two_theta.setflags(write=False)
+    intensity.setflags(write=False)
+    _cache_put(_patterns, key, (two_theta, intensity), PATTERN_CACHE_SIZE)
+    return two_theta, intensity
+
+def decimate(x, y, max_points=MAX_TRACE_POINTS):
+    """
+    Min/max decimation of a dense trace: keeps the lowest and highest point of
+    each bucket, so peaks survive while the line has at most ~max_points points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    size = -(-n // (max_points // 2))
+    rows = -(-n // size)
+    padded = np.full(rows * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(rows, size)
+    base = np.arange(rows) * size
+    keep = np.unique(np.concatenate([
+        base + np.nanargmin(blocks, axis=1), base + np.nanargmax(blocks, axis=1), [0, n - 1]
+    ]))
+    return x[keep], y[keep]
+
+@traced("xrd.render")
+def plot_xrd_overlay(patterns, experiment=None):
+    """
+    Draws simulated stick patterns, given as (label, two_theta, intensity), and
+    optionally a measured (two_theta, intensity) trace on one axis.
+    Uses a standalone Figure (no pyplot registry), so dropping it frees it.
+    """
+    fig = Figure(figsize=(5, 4))
+    ax = fig.subplots()
+
+    if experiment is not None:
+        x, y = decimate(*experiment)
+        ax.plot(x, y, color="black", lw=0.8, alpha=0.7, label="Experiment")
+
+    # We use 'vlines' because theoretical peaks are discrete points
+    for i, (label, two_theta, intensity) in enumerate(patterns):
+        ax.vlines(two_theta, 0, intensity, colors=PHASE_COLORS[i % len(PHASE_COLORS)], lw=2, label=label)
+
+    # Formatting the chart for a scientific look
+    ax.set_xlabel("2θ (degrees)", fontsize=10)
+    ax.set_ylabel("Intensity (a.u.)", fontsize=10)
+    ax.set_title("Simulated Diffraction Pattern", fontsize=12)
+    ax.set_xlim(10, 80)  # Standard range for most minerals/metals
+    ax.set_ylim(0, 110) # Intensities are normalized to 100
+    ax.grid(alpha=0.3)
+    ax.legend()
+
+    # Return the figure object so Streamlit can display it
+    return fig
+
+def plot_xrd_pattern(two_theta, intensity):
+    """
+    Plots a simulated stick pattern (2θ, intensity arrays) and returns the figure.
+    """
+    return plot_xrd_overlay([("Theoretical Peaks", two_theta, intensity)])
 
 def generate_xrd_plot(cif_string):
     """
     Calculates and plots the theoretical XRD pattern from a CIF string.
     """
     try:
-        # 1. Parse the CIF string into a Pymatgen Structure object
-        parser = CifParser.from_str(cif_string)
-        structure = parser.get_structures()[0]
-
-        # 2. Initialize the XRD Calculator (using Cu K-alpha radiation by default)
-        # wavelength=1.5406 angstroms is standard for lab XRD
-        calculator = XRDCalculator(wavelength="CuKa")
-
-        # 3. Calculate the diffraction pattern (2-theta vs intensity)
-        pattern = calculator.get_pattern(structure)
-
-        # 4. Create the plot using Matplotlib
-        fig, ax = plt.subplots(figsize=(5, 4))
-        
-        # We use 'vlines' because theoretical peaks are discrete points
-        ax.vlines(pattern.x, 0, pattern.y, colors='red', lw=2, label="Theoretical Peaks")
-        
-        # Formatting the chart for a scientific look
-        ax.set_xlabel("2θ (degrees)", fontsize=10)
-        ax.set_ylabel("Intensity (a.u.)", fontsize=10)
-        ax.set_title("Simulated Diffraction Pattern", fontsize=12)
-        ax.set_xlim(10, 80)  # Standard range for most minerals/metals
-        ax.set_ylim(0, 110) # Intensities are normalized to 100
-        ax.grid(alpha=0.3)
-        ax.legend()
-
-        # Return the figure object so Streamlit can display it
-        return fig
+        # 1. Calculate the diffraction pattern (2-theta vs intensity)
+        two_theta, intensity = simulate_xrd_pattern(cif_string)
+
+        # 2. Create the plot
+        return plot_xrd_pattern(two_theta, intensity)
 
     except Exception as e:
         # If the CIF is invalid, we return None so the app doesn't crash
-        print(f"Simulation Error: {e}")
-        return None
\ No newline at end of file
+        logger.warning("Simulation Error: %s", e)
+        return None
+
+def render_xrd_png(phases, wavelength="CuKa", experiment=None, dpi=120):
+    """
+    PNG bytes of the simulated pattern(s), optionally over a measured trace.
+    `phases` is a CIF string or a list of (label, cif_string) pairs.
+    Images are cached by structure hashes, wavelength and experiment data;
+    returns None if no phase could be simulated.
+    """
+    if isinstance(phases, str):
+        phases = [("Theoretical Peaks", phases)]
+
+    digest = hashlib.sha256()
+    for label, cif_string in phases:
+        digest.update(f"{label}\0{cif_hash(cif_string)}\0".encode())
+    digest.update(f"{wavelength}\0{dpi}\0".encode())
+    if experiment is not None:
+        for array in experiment:
+            digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    key = digest.hexdigest()
+    cached = _cache_get(_renders, key)
+    if cached is not None:
+        return cached
+
+    patterns = []
+    for label, cif_string in phases:
+        try:
+            patterns.append((label, *simulate_xrd_pattern(cif_string, wavelength)))
+        except Exception as e:
+            logger.warning("Simulation Error (%s): %s", label, e)
+    if not patterns:
+        return None
+
+    fig = plot_xrd_overlay(patterns, experiment)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    png = buffer.getvalue()
+    _cache_put(_renders, key, png, RENDER_CACHE_SIZE)
+    return png
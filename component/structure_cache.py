@@ -0,0 +1,151 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from pymatgen.io.cif import CifParser
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+from component.tracing import span
+
+# Number of parsed structures kept in memory (least recently used are dropped first)
+CACHE_SIZE = int(os.getenv("MATNEXUS_STRUCTURE_CACHE_SIZE", "64"))
+
+# Optional on-disk tier; leave unset to keep the cache purely in memory
+CACHE_DIR = os.getenv("MATNEXUS_STRUCTURE_CACHE_DIR")
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def cif_hash(cif_string):
+    """Content hash of a CIF string (insensitive to line endings and outer whitespace)."""
+    normalized = cif_string.replace("\r\n", "\n").strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class StructureEntry:
+    """
+    A parsed structure plus everything derived from it, computed at most once.
+    Symmetry results are stored per symprec since they depend on the tolerance.
+    """
+
+    def __init__(self, key, structure):
+        self.key = key
+        self.structure = structure
+        self._symmetry = {}
+
+    def symmetry(self, symprec=0.1):
+        """Space group and crystal system from SpacegroupAnalyzer."""
+        if symprec not in self._symmetry:
+            with span("symmetry.analyze", sites=len(self.structure), symprec=symprec):
+                analyzer = SpacegroupAnalyzer(self.structure, symprec=symprec)
+                self._symmetry[symprec] = {
+                    "space_group": analyzer.get_space_group_symbol(),
+                    "space_group_number": analyzer.get_space_group_number(),
+                    "crystal_system": analyzer.get_crystal_system(),
+                }
+            _save_to_disk(self)
+        return self._symmetry[symprec]
+
+    def metrics(self, symprec=0.1):
+        """The physical metrics reported by the physics engine."""
+        lattice = self.structure.lattice
+        symmetry = self.symmetry(symprec)
+        return {
+            "density": self.structure.density,
+            "volume": self.structure.volume,
+            "space_group": symmetry["space_group"],
+            "crystal_system": symmetry["crystal_system"],
+            "formula": self.structure.composition.reduced_formula,
+            "a": lattice.a,
+            "b": lattice.b,
+            "c": lattice.c,
+            "alpha": lattice.alpha,
+            "beta": lattice.beta,
+            "gamma": lattice.gamma
+        }
+
+
+def _disk_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.pkl")
+
+
+def _load_from_disk(key):
+    if not CACHE_DIR:
+        return None
+    try:
+        with open(_disk_path(key), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+
+def _save_to_disk(entry):
+    if not CACHE_DIR:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write to a temp file first so a concurrent reader never sees a partial pickle
+        temp_path = f"{_disk_path(entry.key)}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(entry, f)
+        os.replace(temp_path, _disk_path(entry.key))
+    except OSError:
+        pass
+
+
+def _remember(entry, counter):
+    with _lock:
+        _stats[counter] += 1
+        _entries[entry.key] = entry
+        _entries.move_to_end(entry.key)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def get_entry(cif_string):
+    """
+    Returns the cached StructureEntry for a CIF string, parsing it only on a miss.
+    Raises the parser's exception if the CIF is invalid (failures are not cached).
+    """
+    key = cif_hash(cif_string)
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return entry
+
+    entry = _load_from_disk(key)
+    if entry is not None:
+        _remember(entry, "disk_hits")
+        return entry
+
+    with span("cif.parse", chars=len(cif_string)) as s:
+        structure = CifParser.from_str(cif_string).get_structures()[0]
+        s.set(sites=len(structure))
+    entry = StructureEntry(key, structure)
+    _save_to_disk(entry)
+    _remember(entry, "misses")
+    return entry
+
+
+def get_structure(cif_string):
+    """Shortcut for the parsed pymatgen Structure of a CIF string."""
+    return get_entry(cif_string).structure
+
+
+def cache_info():
+    """Hit/miss counters and the current in-memory size."""
+    with _lock:
+        return {**_stats, "size": len(_entries), "max_size": CACHE_SIZE}
+
+
+def clear_cache():
+    """Drops every in-memory entry (the disk tier is left untouched)."""
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,274 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from component.structure_cache import cif_hash, get_entry
+from component.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Representatives of every structure seen so far (shared by the app, batch workers and reruns)
+INDEX_PATH = os.getenv("MATNEXUS_STRUCTURE_INDEX", os.path.join(".matnexus", "structure_index.sqlite"))
+
+# Set to 0 to skip clustering (and result reuse) of predicted structures
+DEDUP_ENABLED = os.getenv("MATNEXUS_DEDUP", "1").lower() not in ("0", "false", "no")
+
+# StructureMatcher tolerances (pymatgen defaults for ltol/stol/angle_tol)
+LTOL = 0.2
+STOL = 0.3
+ANGLE_TOL = 5.0
+
+# Tighter tolerances under which a member counts as the same cell as its representative,
+# so the representative's metrics and XRD pattern are reused for it
+REUSE_LTOL = 0.005
+REUSE_STOL = 0.05
+REUSE_ANGLE_TOL = 0.5
+
+# Relative width of the volume-per-atom bins; neighbouring bins are searched too
+VOLUME_BIN = 0.1
+
+# Buckets larger than this are searched with a KD-tree instead of a brute-force scan
+KDTREE_MIN = 32
+
+# Resolved CIF hashes and bucket KD-trees kept in memory (least recently used are dropped first)
+MEMO_SIZE = int(os.getenv("MATNEXUS_STRUCTURE_INDEX_MEMO", "1024"))
+TREE_CACHE_SIZE = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS representatives (
+    rep_id TEXT PRIMARY KEY,
+    formula TEXT NOT NULL,
+    space_group INTEGER NOT NULL,
+    sites INTEGER NOT NULL,
+    volume_bin INTEGER NOT NULL,
+    features TEXT NOT NULL,
+    cif TEXT NOT NULL,
+    members INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reps_bucket ON representatives (formula, sites, volume_bin);
+"""
+
+
+def fingerprint(entry):
+    """
+    Cheap descriptors used before any StructureMatcher call: reduced formula,
+    site count, volume-per-atom bin and the Niggli-reduced lattice as scaled
+    (log a, log b, log c, α, β, γ) features. The space group is left out on
+    purpose: a slightly noisy copy often lands in a subgroup of its parent.
+    """
+    structure = entry.structure
+    lattice = structure.lattice.get_niggli_reduced_lattice()
+    order = np.argsort(lattice.abc)
+    lengths = np.log(np.asarray(lattice.abc)[order])
+    angles = np.radians(np.asarray(lattice.angles)[order])
+    # Scaled so that one unit is the matcher's tolerance (angles get twice the slack)
+    features = np.concatenate([lengths / math.log(1 + LTOL), angles / math.radians(2 * ANGLE_TOL)])
+    volume_per_atom = structure.volume / len(structure)
+    return {
+        "formula": structure.composition.reduced_formula,
+        "sites": len(structure),
+        "volume_bin": int(math.floor(math.log(volume_per_atom) / math.log(1 + VOLUME_BIN))),
+        "features": features
+    }
+
+
+class StructureIndex:
+    """
+    Maps structures to cluster representatives. A structure is compared with
+    StructureMatcher only against representatives that share its formula,
+    site count and volume bin and lie within tolerance in lattice space
+    (KD-tree for large buckets), so each lookup stays far from quadratic.
+    Cluster members can differ by several percent in lattice and density, so a
+    member reuses its representative's results only when a second, tight
+    match confirms it is the same cell (see canonical_cif).
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._resolve_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+        self._resolved = OrderedDict()
+        self._trees = OrderedDict()
+        self._matcher = None
+        self._reuse_matcher = None
+        self.stats = {"lookups": 0, "clustered": 0, "reused": 0, "matcher_calls": 0}
+
+    def _get_matcher(self):
+        if self._matcher is None:
+            from pymatgen.analysis.structure_matcher import StructureMatcher
+            self._matcher = StructureMatcher(
+                ltol=LTOL, stol=STOL, angle_tol=ANGLE_TOL, primitive_cell=False, scale=False, attempt_supercell=False
+            )
+        return self._matcher
+
+    def _same_cell(self, structure, representative):
+        """Whether a cluster member is close enough to its representative to share its results."""
+        if self._reuse_matcher is None:
+            from pymatgen.analysis.structure_matcher import StructureMatcher
+            self._reuse_matcher = StructureMatcher(
+                ltol=REUSE_LTOL, stol=REUSE_STOL, angle_tol=REUSE_ANGLE_TOL,
+                primitive_cell=False, scale=False, attempt_supercell=False
+            )
+        return self._reuse_matcher.fit(structure, representative)
+
+    def _memo_get(self, cache, key):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        return None
+
+    def _memo_put(self, cache, key, value, size):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > size:
+                cache.popitem(last=False)
+
+    def _bucket(self, fp):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rep_id, features, cif FROM representatives "
+                "WHERE formula = ? AND sites = ? AND volume_bin BETWEEN ? AND ? ORDER BY created_at",
+                (fp["formula"], fp["sites"], fp["volume_bin"] - 1, fp["volume_bin"] + 1)
+            ).fetchall()
+        return rows
+
+    def candidates(self, fp):
+        """Representatives that survive the prefilter, nearest in lattice space first."""
+        rows = self._bucket(fp)
+        if not rows:
+            return []
+        features = np.array([json.loads(row["features"]) for row in rows])
+        if len(rows) >= KDTREE_MIN:
+            from scipy.spatial import cKDTree
+            key = (fp["formula"], fp["sites"], fp["volume_bin"], len(rows))
+            tree = self._memo_get(self._trees, key)
+            if tree is None:
+                tree = cKDTree(features)
+                self._memo_put(self._trees, key, tree, TREE_CACHE_SIZE)
+            near = tree.query_ball_point(fp["features"], r=1.0, p=np.inf)
+        else:
+            near = np.nonzero(np.max(np.abs(features - fp["features"]), axis=1) <= 1.0)[0]
+        distance = np.max(np.abs(features[near] - fp["features"]), axis=1) if len(near) else []
+        return [rows[i] for _, i in sorted(zip(distance, near))]
+
+    def resolve(self, cif_string):
+        """
+        The representative for a CIF, registering it as a new one when nothing matches.
+        Returns {"rep_id", "cif", "new", "same_cell"}; same_cell is True when the
+        representative's results are valid for this CIF. The same CIF text
+        resolves from memory afterwards.
+        """
+        key = cif_hash(cif_string)
+        cached = self._memo_get(self._resolved, key)
+        if cached is not None:
+            return cached
+
+        entry = get_entry(cif_string)
+        # Lookup and insert under one lock, so two threads can't both register the same new structure
+        with self._resolve_lock, span("structure.dedup") as s:
+            cached = self._memo_get(self._resolved, key)
+            if cached is not None:
+                return cached
+            self.stats["lookups"] += 1
+            fp = fingerprint(entry)
+            survivors = self.candidates(fp)
+            s.set(candidates=len(survivors))
+            result = None
+            for row in survivors:
+                self.stats["matcher_calls"] += 1
+                representative = get_entry(row["cif"]).structure
+                if self._get_matcher().fit(entry.structure, representative):
+                    same_cell = self._same_cell(entry.structure, representative)
+                    result = {"rep_id": row["rep_id"], "cif": row["cif"], "new": False, "same_cell": same_cell}
+                    with self._lock, self._conn:
+                        self._conn.execute("UPDATE representatives SET members = members + 1 WHERE rep_id = ?", (row["rep_id"],))
+                    self.stats["clustered"] += 1
+                    if same_cell:
+                        self.stats["reused"] += 1
+                    break
+            if result is None:
+                result = {"rep_id": uuid.uuid4().hex[:12], "cif": cif_string, "new": True, "same_cell": True}
+                # Shared with analyze_structure's metrics (same entry, same symprec), so not an extra analysis
+                space_group = entry.symmetry(symprec=0.1)["space_group_number"]
+                with self._lock, self._conn:
+                    self._conn.execute(
+                        "INSERT INTO representatives "
+                        "(rep_id, formula, space_group, sites, volume_bin, features, cif, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (result["rep_id"], fp["formula"], space_group, fp["sites"], fp["volume_bin"],
+                         json.dumps(fp["features"].tolist()), cif_string, time.time())
+                    )
+            s.set(clustered=not result["new"], reused=not result["new"] and result["same_cell"])
+            self._memo_put(self._resolved, key, result, MEMO_SIZE)
+        return result
+
+    def cluster(self, cif_strings):
+        """Representative ID of every CIF, in order; equal IDs form one cluster."""
+        return [self.resolve(cif)["rep_id"] for cif in cif_strings]
+
+    def clusters(self, limit=50):
+        """Largest clusters first: representative ID, formula, space group and member count."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rep_id, formula, space_group, members FROM representatives ORDER BY members DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_structure_index():
+    """Process-wide index; the SQLite file is shared with other processes."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = StructureIndex(INDEX_PATH)
+        return _index
+
+
+def cluster_id(cif_string):
+    """Representative ID of a structure, or None when dedup is disabled or it can't be indexed."""
+    if not DEDUP_ENABLED:
+        return None
+    try:
+        return get_structure_index().resolve(cif_string)["rep_id"]
+    except Exception as e:
+        logger.warning("Structure dedup skipped: %s", e)
+        return None
+
+
+def canonical_cif(cif_string):
+    """
+    The CIF whose results stand in for this one: its representative's when the
+    two are the same cell (so cached metrics and patterns are reused), else the
+    CIF itself. Falls back to the CIF itself when dedup is off or indexing fails.
+    """
+    if not DEDUP_ENABLED:
+        return cif_string
+    try:
+        match = get_structure_index().resolve(cif_string)
+    except Exception as e:
+        logger.warning("Structure dedup skipped: %s", e)
+        return cif_string
+    return match["cif"] if match["same_cell"] else cif_string
@@ -0,0 +1,318 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS comes from psutil when it is installed
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Finished spans are appended here, one JSON object per line
+TRACE_PATH = os.getenv("MATNEXUS_TRACE_PATH", os.path.join(".matnexus", "traces.jsonl"))
+
+# Once the trace file passes this size it is moved to <path>.1 (replacing the previous one) and restarted
+TRACE_MAX_BYTES = int(float(os.getenv("MATNEXUS_TRACE_MB", "50")) * 1024 * 1024)
+
+# Set to serve Prometheus text metrics on http://127.0.0.1:<port>/metrics
+METRICS_PORT = os.getenv("MATNEXUS_METRICS_PORT")
+
+# Spans kept in memory for the performance panel
+RECENT_SPANS = int(os.getenv("MATNEXUS_TRACE_BUFFER", "2000"))
+
+TOKEN_FIELDS = ("prompt_token_count", "candidates_token_count", "thoughts_token_count", "total_token_count")
+
+_trace_id = contextvars.ContextVar("matnexus_trace_id", default=None)
+_current_span = contextvars.ContextVar("matnexus_span", default=None)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (MB), or None where it can't be read."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    # Windows tracks the peak working set; elsewhere only the current RSS is known
+    return getattr(memory, "peak_wset", memory.rss) / 1024 / 1024
+
+
+def _rounded(megabytes):
+    return None if megabytes is None else round(megabytes, 1)
+
+
+class Span:
+    """One timed operation; attributes can be added while it is open."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.span_id = uuid.uuid4().hex[:8]
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = _trace_id.get()
+        self.status = "ok"
+        self.error = None
+        self.started = time.time()
+        self.seconds = 0.0
+        self._perf_start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def elapsed(self):
+        return time.perf_counter() - self._perf_start
+
+    def fail(self, error):
+        """Marks the span failed for errors that are handled rather than raised."""
+        self.status = "error"
+        self.error = str(error)
+
+    def record_usage(self, usage_metadata):
+        """Copies token counts from a Gemini response's usage_metadata."""
+        if usage_metadata is None:
+            return
+        for field in TOKEN_FIELDS:
+            value = getattr(usage_metadata, field, None)
+            if value is not None:
+                self.attrs[field] = value
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "started": self.started, "seconds": round(self.seconds, 6),
+            "status": self.status, "error": self.error, "thread": threading.current_thread().name,
+            "peak_rss_mb": _rounded(peak_rss_mb()), **self.attrs
+        }
+
+
+class Tracer:
+    """
+    Collects finished spans: appends them to a JSONL file, keeps the most recent
+    ones in memory and maintains per-name counters for the metrics endpoint.
+    The file is rotated once it passes max_bytes, so at most about twice that is kept on disk.
+    """
+
+    def __init__(self, path=TRACE_PATH, buffer_size=RECENT_SPANS, max_bytes=TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=buffer_size)
+        self._totals = defaultdict(lambda: {"count": 0, "errors": 0, "seconds": 0.0})
+        self._tokens = defaultdict(int)
+        self._gauges = {}
+        self._size = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._size = self._file_size()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = Span(name, attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.fail(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def start_span(self, name, **attrs):
+        """
+        Opens a span without making it the current parent, for work that is
+        interleaved with its caller (e.g. a generator); close it with finish().
+        """
+        return Span(name, attrs)
+
+    def finish(self, span):
+        span.seconds = span.elapsed()
+        self.record(span)
+
+    def record(self, span):
+        record = span.to_dict()
+        with self._lock:
+            self._recent.append(record)
+            totals = self._totals[span.name]
+            totals["count"] += 1
+            totals["seconds"] += span.seconds
+            totals["errors"] += span.status != "ok"
+            for field in TOKEN_FIELDS:
+                if field in span.attrs:
+                    self._tokens[(span.attrs.get("model", ""), field)] += span.attrs[field]
+            if self.path:
+                line = json.dumps(record, default=str) + "\n"
+                try:
+                    if self._size + len(line) > self.max_bytes:
+                        # Re-read the size: other processes append to the same file (and may have rotated it)
+                        self._size = self._file_size()
+                        if self._size + len(line) > self.max_bytes:
+                            os.replace(self.path, f"{self.path}.1")
+                            self._size = 0
+                    with open(self.path, "a") as f:
+                        f.write(line)
+                    self._size += len(line)
+                except OSError as e:
+                    logger.warning("Could not write trace: %s", e)
+
+    def _file_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def register_gauge(self, name, func, help_text=""):
+        """`func()` returns a number or a {label: number} dict, read at scrape time."""
+        self._gauges[name] = (func, help_text)
+
+    def spans(self, trace_id=None):
+        with self._lock:
+            return [s for s in self._recent if trace_id is None or s["trace_id"] == trace_id]
+
+    def summary(self, trace_id):
+        """Spans of one run plus its token totals, current gauges and peak RSS, for the UI."""
+        spans = self.spans(trace_id)
+        tokens = defaultdict(int)
+        for s in spans:
+            for field in TOKEN_FIELDS:
+                tokens[field] += s.get(field) or 0
+        return {"spans": spans, "tokens": dict(tokens), "gauges": self.gauge_values(), "peak_rss_mb": peak_rss_mb()}
+
+    def gauge_values(self):
+        values = {}
+        for name, (func, _) in list(self._gauges.items()):
+            try:
+                values[name] = func()
+            except Exception as e:
+                logger.warning("Gauge %s failed: %s", name, e)
+        return values
+
+    def prometheus_text(self):
+        """Counters, token totals and gauges in the Prometheus text exposition format."""
+        lines = [
+            "# HELP matnexus_span_seconds_total Time spent in each traced operation.",
+            "# TYPE matnexus_span_seconds_total counter",
+        ]
+        with self._lock:
+            totals = {name: dict(t) for name, t in self._totals.items()}
+            tokens = dict(self._tokens)
+        for name, t in sorted(totals.items()):
+            lines.append(f'matnexus_span_seconds_total{{span="{name}"}} {t["seconds"]:.6f}')
+        lines += ["# HELP matnexus_span_count_total Finished spans per operation.", "# TYPE matnexus_span_count_total counter"]
+        for name, t in sorted(totals.items()):
+            lines.append(f'matnexus_span_count_total{{span="{name}"}} {t["count"]}')
+        lines += ["# HELP matnexus_span_errors_total Failed spans per operation.", "# TYPE matnexus_span_errors_total counter"]
+        for name, t in sorted(totals.items()):
+            lines.append(f'matnexus_span_errors_total{{span="{name}"}} {t["errors"]}')
+        lines += ["# HELP matnexus_tokens_total Gemini tokens by model and kind.", "# TYPE matnexus_tokens_total counter"]
+        for (model, field), count in sorted(tokens.items()):
+            lines.append(f'matnexus_tokens_total{{model="{model}",kind="{field.replace("_token_count", "")}"}} {count}')
+        peak = peak_rss_mb()
+        if peak is not None:
+            lines += ["# HELP matnexus_peak_rss_megabytes Peak resident set size.", "# TYPE matnexus_peak_rss_megabytes gauge",
+                      f"matnexus_peak_rss_megabytes {peak:.1f}"]
+        for name, value in sorted(self.gauge_values().items()):
+            help_text = self._gauges[name][1]
+            lines += [f"# HELP matnexus_{name} {help_text}", f"# TYPE matnexus_{name} gauge"]
+            if isinstance(value, dict):
+                lines += [f'matnexus_{name}{{key="{k}"}} {v}' for k, v in sorted(value.items())]
+            else:
+                lines.append(f"matnexus_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Process-wide tracer; starts the metrics endpoint on first use when MATNEXUS_METRICS_PORT is set."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            _register_cache_gauges(_tracer)
+            if METRICS_PORT:
+                serve_metrics(_tracer, int(METRICS_PORT))
+        return _tracer
+
+
+def span(name, **attrs):
+    """Context manager timing one operation on the shared tracer."""
+    return get_tracer().span(name, **attrs)
+
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_trace(trace_id):
+    """Tags the spans of the current context (and stages started from it) with a run ID."""
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def _register_cache_gauges(tracer):
+    def hit_rate(stats, hits=("hits",), misses=("misses",)):
+        hit = sum(stats.get(k, 0) for k in hits)
+        total = hit + sum(stats.get(k, 0) for k in misses)
+        return round(hit / total, 4) if total else 0.0
+
+    def cache_hit_rates():
+        from component.response_cache import get_response_cache
+        from component.structure_cache import cache_info
+        return {
+            "structure": hit_rate(cache_info(), hits=("hits", "disk_hits")),
+            "response": hit_rate(get_response_cache().stats, hits=("hits", "shared"))
+        }
+
+    tracer.register_gauge("cache_hit_ratio", cache_hit_rates, "Hit ratio of the structure and model-response caches.")
+
+
+def serve_metrics(tracer, port, host="127.0.0.1"):
+    """Serves tracer.prometheus_text() at /metrics from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        # Another Streamlit process already serves this port
+        logger.warning("Metrics endpoint not started on port %s: %s", port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="matnexus-metrics", daemon=True).start()
+    return server
@@ -1,13 +1,15 @@
 from stmol import showmol 
 import py3Dmol 
+from component.tracing import traced
 
+@traced("structure.render")
 def render_crystal(cif_string):
     """Render a crystal structure from a CIF string."""
     
     # create a py3Dmol viewer
     view = py3Dmol.view(width=400, height=400)
     
-    # add CIF data to the view 
+    # add CIF data to the view
     view.addModel(cif_string, "cif")
 
     # set style : sphere -> atoms, sticks -> bonds 
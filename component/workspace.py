@@ -0,0 +1,201 @@
+import streamlit as st
+
+from component.run_history import new_workspace_id
+
+def current_workspace_id():
+    """
+    Run-history scope of this browser: the `workspace` URL parameter, created on
+    the first visit, so a bookmarked link reopens its own runs and nobody else's.
+    """
+    workspace_id = st.query_params.get("workspace")
+    if not workspace_id:
+        workspace_id = st.session_state.setdefault("workspace_id", new_workspace_id())
+        st.query_params["workspace"] = workspace_id
+    return workspace_id
+
+def open_run(run_id):
+    """Sidebar callback: makes a stored run the active workspace."""
+    st.session_state["active_run"] = run_id
+
+def clear_active_run():
+    st.session_state.pop("active_run", None)
+
+def create_workspace(cif_data, multi_phase=False):
+    """
+    Lays out the Integrated Discovery Workspace and returns empty slots
+    (report, structure, dft, xrd, xrd_match, command, plus phases for
+    multi-phase samples) to be filled as results arrive.
+    """
+    slots = {}
+    st.divider()
+    st.markdown("<h2 style='text-align: center; color: #00ffcc;'>📊 Integrated Discovery Workspace</h2>", unsafe_allow_html=True)
+
+    # --- TOP ROW: PRIMARY ACTIONS ---
+    with st.container(border=True):
+        col_dl1, col_dl2, col_dl3 = st.columns([1, 1, 1])
+        with col_dl1:
+            st.download_button("💾 Export Structure (.CIF)", data=cif_data, file_name="predicted.cif", width='stretch')
+        with col_dl2:
+            slots["report"] = st.empty()
+        with col_dl3:
+            st.button("🔄 Clear & Re-run", width='stretch', on_click=clear_active_run)
+
+    # --- MIDDLE ROW: ANALYTICS ---
+    res_c1, res_c2 = st.columns([1.2, 1])
+    with res_c1:
+        with st.container(border=True):
+            st.markdown("#### 📦 Structural Ground-Truth")
+            slots["structure"] = st.empty()
+    with res_c2:
+        with st.container(border=True):
+            st.markdown("#### ⚛️ Quantum Property Prediction")
+            slots["dft"] = st.empty()
+
+    # --- BOTTOM ROW: VISUALS & ROBOTICS ---
+    vis_c1, vis_c2 = st.columns(2)
+    with vis_c1:
+        with st.container(border=True):
+            st.markdown("#### 🧊 3D Unit Cell Rendering")
+            # stmol/py3Dmol only load once a structure is actually shown
+            from component.visualizer import render_crystal
+            render_crystal(cif_data)
+    with vis_c2:
+        with st.container(border=True):
+            st.markdown("#### 📈 Predicted Powder Diffraction")
+            slots["xrd"] = st.empty()
+            slots["xrd_match"] = st.empty()
+
+    if multi_phase:
+        with st.container(border=True):
+            st.markdown("#### 🧪 Phase Composition")
+            slots["phases"] = st.empty()
+            slots["phases"].caption("⏳ Running...")
+
+    # --- FOOTER: AUTONOMOUS COMMAND ---
+    st.divider()
+    st.markdown("### 🤖 Autonomous Synthesis Command")
+    slots["command"] = st.empty()
+    return slots
+
+def render_report_download(slot, report_md):
+    with slot.container():
+        st.download_button("📄 Download Research Brief", data=report_md, file_name="MatNexus_Report.md", width='stretch', type="primary")
+
+def render_structure_panel(results, mp_ref=None):
+    """Formula, MP density check and extended crystallographic data."""
+    if "error" in results:
+        st.warning(f"Structure analysis failed: {results['error']}")
+        return
+
+    m1, m2 = st.columns(2)
+    m1.metric("Formula", results['formula'])
+    if mp_ref and "error" not in mp_ref:
+        m2.metric("AI Density", f"{results['density']:.2f} g/cm³", delta=f"{results['density'] - mp_ref['density']:.2f} vs MP")
+        st.caption(f"📍 Verified via [Materials Project: {mp_ref['mp_id']}](https://next-gen.materialsproject.org/materials/{mp_ref['mp_id']})")
+
+    with st.expander("🔍 Extended Crystallographic Data", expanded=True):
+        st.write(f"**Space Group:** {results['space_group']}")
+        st.write(f"**Crystal System:** {results.get('crystal_system', 'N/A')}")
+        st.write(f"**Lattice (a,b,c):** {results['a']:.3f}, {results['b']:.3f}, {results['c']:.3f}")
+
+def render_phase_panel(phase_results, fractions):
+    """One row per phase (formula, symmetry, MP check, warnings) and the pattern share of each."""
+    rows = []
+    for phase in phase_results:
+        metrics = phase["metrics"]
+        if "error" in metrics:
+            rows.append({"Phase": phase["name"], "Formula": "—", "Space Group": "—", "Density (g/cm³)": None,
+                         "MP": "—", "Pattern Share": None, "Notes": metrics["error"]})
+            continue
+        mp_ref = phase.get("mp_ref")
+        rows.append({
+            "Phase": phase["name"],
+            "Formula": metrics["formula"],
+            "Space Group": metrics["space_group"],
+            "Density (g/cm³)": round(metrics["density"], 2),
+            "MP": mp_ref["mp_id"] if mp_ref and "error" not in mp_ref else "—",
+            "Pattern Share": f"{fractions[phase['name']]:.0%}" if phase["name"] in fractions else None,
+            "Notes": "; ".join(phase.get("warnings", [])) or phase.get("xrd_error", "")
+                     or (f"Same structure as {phase['duplicate_of']}" if phase.get("duplicate_of") else "")
+        })
+    st.dataframe(rows, width='stretch', hide_index=True)
+    if fractions:
+        st.bar_chart({"Pattern share": fractions}, horizontal=True)
+        st.caption("Share of the diffraction pattern explained by each phase (semi-quantitative, not a Rietveld weight fraction).")
+
+def render_xrd_match(matches):
+    """Peak-match summary (and reference search-match candidates) per digitized experimental trace."""
+    for label, match, candidates in matches:
+        shift = f", mean Δ2θ {match['mean_shift']:+.2f}°" if match["mean_shift"] is not None else ""
+        st.caption(f"🎯 {label}: {match['matched']} simulated peaks matched, {match['score']:.0%} of intensity{shift}")
+        if candidates:
+            st.caption("🔎 Reference search-match: " + ", ".join(
+                f"{c['formula']} ({c['id']}, {c['score']:.2f}, {c['matched_peaks']} peaks)" for c in candidates
+            ))
+
+def render_performance_panel(summary):
+    """Collapsible breakdown of where a run spent its time, tokens and memory."""
+    spans = summary["spans"]
+    with st.expander("⏱️ Performance", expanded=False):
+        if not spans:
+            st.caption("No timing recorded for this run.")
+            return
+        wall = max(s["started"] + s["seconds"] for s in spans) - min(s["started"] for s in spans)
+        tokens = summary["tokens"]
+        hit_rates = summary["gauges"].get("cache_hit_ratio", {})
+        p1, p2, p3, p4 = st.columns(4)
+        p1.metric("Wall Time", f"{wall:.1f} s")
+        p2.metric("Tokens", f"{tokens.get('total_token_count', 0):,}")
+        p3.metric("Peak RSS", f"{summary['peak_rss_mb']:.0f} MB" if summary["peak_rss_mb"] is not None else "—")
+        p4.metric("Cache Hits", " / ".join(f"{name} {rate:.0%}" for name, rate in hit_rates.items()) or "—")
+        rows = [{
+            "Span": s["name"],
+            "Start (s)": round(s["started"] - min(x["started"] for x in spans), 2),
+            "Seconds": round(s["seconds"], 3),
+            "Tokens": s.get("total_token_count"),
+            "Status": s["status"] if s["status"] == "ok" else f"{s['status']}: {s['error']}"
+        } for s in sorted(spans, key=lambda s: s["started"])]
+        st.dataframe(rows, width='stretch', hide_index=True)
+
+def render_stage_failure(label, stage_result):
+    """Warning shown in place of a panel whose stage failed or timed out."""
+    st.warning(f"{label} unavailable ({stage_result.status}): {stage_result.error}")
+
+def render_synthesis_command(results, mp_ref=None):
+    """Autonomous correction advice based on the AI vs MP density gap."""
+    if "error" in results:
+        st.info("**System Idle:** No valid structure to evaluate.")
+    elif mp_ref and "error" not in mp_ref and abs(results['density'] - mp_ref['density']) > 0.5:
+        st.error(f"**System Warning:** High Lattice Discrepancy. **Correction:** Increase Sintering Time by 20% to stabilize the {results['formula']} phase.")
+    else:
+        st.success(f"**System Ready:** AI prediction aligns with {results['formula']} standards. Proceed to next stage.")
+
+def render_saved_run(run):
+    """Rehydrates a stored run into the workspace without recomputing anything."""
+    st.markdown("### 📝 Multimodal Research Report")
+    st.markdown(run["analysis_text"] or "")
+    if not run.get("cif"):
+        return
+
+    phases = run.get("phases")
+    slots = create_workspace(run["cif"], multi_phase=bool(phases))
+    metrics = run.get("metrics") or {"error": "No analysis stored for this run"}
+    if run.get("report"):
+        render_report_download(slots["report"], run["report"])
+    with slots["structure"].container():
+        render_structure_panel(metrics, run.get("mp_ref"))
+    with slots["dft"].container():
+        st.markdown(run.get("dft_text") or "_No prediction stored for this run._")
+    with slots["xrd"].container():
+        if run.get("xrd_png"):
+            st.image(run["xrd_png"], width='stretch')
+        else:
+            st.caption("No diffraction pattern stored for this run.")
+    if run.get("xrd_match"):
+        with slots["xrd_match"].container():
+            render_xrd_match(run["xrd_match"])
+    if phases:
+        with slots["phases"].container():
+            render_phase_panel(phases["results"], phases["fractions"])
+    with slots["command"].container():
+        render_synthesis_command(metrics, run.get("mp_ref"))
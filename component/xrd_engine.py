@@ -0,0 +1,195 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+from pymatgen.core import Element
+from pymatgen.analysis.diffraction.xrd import ATOMIC_SCATTERING_PARAMS, WAVELENGTHS
+
+# Peaks closer than this (degrees 2θ) are merged into one line, as in pymatgen
+TWO_THETA_TOL = 1e-5
+
+# Peaks weaker than this (percent of the strongest line) are dropped
+SCALED_INTENSITY_TOL = 1e-3
+
+# Upper bound on variants x reflections evaluated in one vectorized block
+CHUNK_ENTRIES = 2_000_000
+
+
+def resolve_wavelength(wavelength):
+    """Accepts a radiation name ("CuKa") or a wavelength in angstroms."""
+    if isinstance(wavelength, str):
+        return WAVELENGTHS[wavelength]
+    return float(wavelength)
+
+
+@lru_cache(maxsize=None)
+def _scattering_table(symbols):
+    """
+    Atomic number and Cromer-Mann style coefficients for a tuple of elements,
+    built once per species set and reused by every pattern that needs it.
+    """
+    z = np.array([Element(sym).Z for sym in symbols], dtype=float)
+    coeffs = np.array([ATOMIC_SCATTERING_PARAMS[sym] for sym in symbols], dtype=float)
+    return z, coeffs[:, :, 0], coeffs[:, :, 1]
+
+
+def scattering_factors(symbols, s2):
+    """
+    Atomic scattering factors f(s) for each element at every s² = (sinθ/λ)².
+    Returns an array of shape (len(symbols), *s2.shape).
+    """
+    z, a, b = _scattering_table(tuple(symbols))
+    s2 = np.asarray(s2)[None, ...]
+    expand = (slice(None), slice(None)) + (None,) * (s2.ndim - 1)
+    gaussians = np.sum(a[expand] * np.exp(-b[expand] * s2[:, None]), axis=1)
+    return z.reshape((-1,) + (1,) * (s2.ndim - 1)) - 41.78214 * s2 * gaussians
+
+
+@lru_cache(maxsize=32)
+def _hkl_grid(h_max, k_max, l_max):
+    """
+    Every Miller index in the half-space h>0 | (h=0, k>0) | (h=k=0, l>0).
+    Friedel's law makes the other half identical, so it is never computed.
+    Lattices with the same bounds share one (read-only) grid.
+    """
+    h, k, l = np.meshgrid(
+        np.arange(-h_max, h_max + 1),
+        np.arange(-k_max, k_max + 1),
+        np.arange(-l_max, l_max + 1),
+        indexing="ij"
+    )
+    hkl = np.stack([h.ravel(), k.ravel(), l.ravel()], axis=1)
+    half = (hkl[:, 0] > 0) | ((hkl[:, 0] == 0) & (hkl[:, 1] > 0)) | (
+        (hkl[:, 0] == 0) & (hkl[:, 1] == 0) & (hkl[:, 2] > 0)
+    )
+    grid = hkl[half]
+    grid.setflags(write=False)
+    return grid
+
+
+def _site_signature(structure):
+    """Element list, per-site occupancy matrix and fractional coordinates."""
+    symbols = sorted({sp.symbol for site in structure for sp in site.species})
+    column = {sym: i for i, sym in enumerate(symbols)}
+    weights = np.zeros((len(structure), len(symbols)))
+    for i, site in enumerate(structure):
+        for sp, occu in site.species.items():
+            weights[i, column[sp.symbol]] += occu
+    return tuple(symbols), weights, np.asarray(structure.frac_coords, dtype=float)
+
+
+def _merge_peaks(two_theta, intensity, scaled):
+    """Sums reflections that land on the same 2θ and applies the intensity cutoff."""
+    keys = np.round(two_theta / TWO_THETA_TOL).astype(np.int64)
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    merged = np.bincount(inverse, weights=intensity)
+    x = two_theta[first]
+    if merged.size == 0:
+        return x, merged
+    keep = merged / merged.max() * 100 > SCALED_INTENSITY_TOL
+    x, y = x[keep], merged[keep]
+    if scaled:
+        y = y / y.max() * 100
+    return x, y
+
+
+def _simulate_group(matrices, symbols, weights, frac_coords, wavelength, two_theta_range, scaled):
+    """
+    Patterns for several lattices that share one set of sites (same species and
+    fractional coordinates): the hkl grid and the phase sums are computed once,
+    and only the scattering factors and Lorentz-polarization terms vary per lattice.
+    """
+    matrices = np.asarray(matrices, dtype=float)  # (V, 3, 3)
+    min_r, max_r = [2 * math.sin(math.radians(t / 2)) / wavelength for t in two_theta_range]
+
+    # Largest index that can reach the limiting sphere for any lattice in the group
+    lengths = np.linalg.norm(matrices, axis=2).max(axis=0)  # (3,)
+    bounds = tuple(int(math.floor(max_r * length)) for length in lengths)
+    hkl = _hkl_grid(*bounds)  # (M, 3)
+
+    recip = np.transpose(np.linalg.inv(matrices), (0, 2, 1))  # (V, 3, 3), rows a*, b*, c*
+    g = np.linalg.norm(hkl[None, :, :] @ recip, axis=2)  # (V, M)
+
+    # Only keep reflections that fall inside the range for at least one lattice
+    inside = (g >= min_r) & (g <= max_r)
+    used = inside.any(axis=0)
+    hkl, g, inside = hkl[used], g[:, used], inside[:, used]
+
+    # Occupancy-weighted phase sums per element: (M, n_species); shared by all lattices
+    phases = np.exp(2j * math.pi * (hkl @ frac_coords.T)) @ weights
+
+    patterns = []
+    chunk = max(1, CHUNK_ENTRIES // max(1, len(hkl)))
+    for start in range(0, len(matrices), chunk):
+        g_chunk = g[start:start + chunk]  # (v, M)
+        s2 = (g_chunk / 2) ** 2
+        fs = scattering_factors(symbols, s2)  # (n_species, v, M)
+        f_hkl = np.einsum("svm,ms->vm", fs, phases)
+        theta = np.arcsin(np.clip(wavelength * g_chunk / 2, -1, 1))
+        lorentz = (1 + np.cos(2 * theta) ** 2) / (np.sin(theta) ** 2 * np.cos(theta))
+        # Factor 2: the Friedel half-space contributes identically
+        intensity = 2 * (f_hkl * f_hkl.conj()).real * lorentz
+        two_theta = np.degrees(2 * theta)
+
+        for row in range(len(g_chunk)):
+            mask = inside[start + row]
+            patterns.append(_merge_peaks(two_theta[row, mask], intensity[row, mask], scaled))
+    return patterns
+
+
+def simulate_patterns(structures, wavelength="CuKa", two_theta_range=(0, 90), scaled=True):
+    """
+    Simulates powder XRD patterns for many structures in one batched pass.
+    Structures with identical sites (e.g. strained copies) are evaluated together.
+
+    Returns a list of (two_theta, intensity) NumPy array pairs in input order,
+    with intensities scaled so the strongest line is 100 unless scaled=False.
+    """
+    wavelength = resolve_wavelength(wavelength)
+    groups = {}
+    for index, structure in enumerate(structures):
+        symbols, weights, frac_coords = _site_signature(structure)
+        key = (symbols, weights.tobytes(), np.round(frac_coords, 8).tobytes())
+        group = groups.setdefault(key, {"indices": [], "matrices": [], "sites": (symbols, weights, frac_coords)})
+        group["indices"].append(index)
+        group["matrices"].append(structure.lattice.matrix)
+
+    results = [None] * len(structures)
+    for group in groups.values():
+        symbols, weights, frac_coords = group["sites"]
+        patterns = _simulate_group(
+            group["matrices"], symbols, weights, frac_coords, wavelength, two_theta_range, scaled
+        )
+        for index, pattern in zip(group["indices"], patterns):
+            results[index] = pattern
+    return results
+
+
+def strain_matrices(lattice_matrix, strains):
+    """
+    Lattice matrices deformed by each strain: a scalar (isotropic), a length-3
+    sequence (normal strains along x, y, z) or a full 3x3 strain tensor.
+    """
+    lattice_matrix = np.asarray(lattice_matrix, dtype=float)
+    deformed = []
+    for strain in strains:
+        strain = np.asarray(strain, dtype=float)
+        if strain.ndim == 0:
+            strain = np.eye(3) * strain
+        elif strain.ndim == 1:
+            strain = np.diag(strain)
+        # Row vectors a_i become (I + ε) a_i
+        deformed.append(lattice_matrix @ (np.eye(3) + strain).T)
+    return np.array(deformed)
+
+
+def simulate_strained_patterns(structure, strains, wavelength="CuKa", two_theta_range=(0, 90), scaled=True):
+    """
+    Patterns for a structure under a set of strains, without building a
+    Structure per variant. Useful for lattice-refinement sweeps.
+    """
+    symbols, weights, frac_coords = _site_signature(structure)
+    matrices = strain_matrices(structure.lattice.matrix, strains)
+    return _simulate_group(
+        matrices, symbols, weights, frac_coords, resolve_wavelength(wavelength), two_theta_range, scaled
+    )
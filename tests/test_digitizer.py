@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+pytest.importorskip("scipy")
+
+from component.digitizer import digitize_xrd, match_peaks
+
+ZNO_PLOT = os.path.join(os.path.dirname(__file__), os.pardir, "data", "ZnO.png")
+
+# Wurtzite ZnO (100), (002) and (101) reflections, Cu Kα
+ZNO_PEAKS = (31.8, 34.4, 36.3)
+
+
+def test_zno_plot_peaks():
+    # The plot's x axis is labelled from 10° to 70°
+    curves = digitize_xrd(ZNO_PLOT, tick_range=(10, 70))["curves"]
+    assert curves
+
+    def found(curve):
+        peaks = np.asarray(curve["peaks"]["two_theta"])
+        return all(peaks.size and np.min(np.abs(peaks - expected)) <= 0.4 for expected in ZNO_PEAKS)
+
+    assert any(found(curve) for curve in curves)
+
+
+def test_match_ignores_reference_peaks_outside_the_plotted_range():
+    observed = [31.8, 34.4, 36.3]
+    reference = [31.8, 34.4, 36.3, 81.4, 89.6]
+    intensity = [60, 45, 100, 10, 10]
+
+    full = match_peaks(observed, reference, intensity)
+    clipped = match_peaks(observed, reference, intensity, two_theta_range=(10, 70))
+
+    assert full["score"] < 1.0
+    assert clipped["score"] == pytest.approx(1.0)
+    assert clipped["matched"] == 3
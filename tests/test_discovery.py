@@ -0,0 +1,39 @@
+from benchmarks.fixtures import ZNO_CIF, model_response
+from component.discovery import closed_cif, extract_cif, extract_cifs
+
+
+def test_fenced_phases_get_unique_names():
+    phases = extract_cifs(model_response([ZNO_CIF, ZNO_CIF]))
+    assert [p["name"] for p in phases] == ["ZnO", "ZnO #2"]
+    assert phases[0]["cif"] == ZNO_CIF.strip()
+
+
+def test_unfenced_cif_stops_before_trailing_prose():
+    text = "Here is the structure:\n\n" + ZNO_CIF + "This is wurtzite ZnO, refined against the measured peaks.\n"
+    assert extract_cif(text) == ZNO_CIF.strip()
+
+
+def test_unfenced_cif_stops_at_a_blank_line_before_prose():
+    text = ZNO_CIF + "\nHope this helps!\n"
+    assert extract_cif(text) == ZNO_CIF.strip()
+
+
+def test_unfenced_cif_drops_a_half_filled_loop_row():
+    text = ZNO_CIF + "Hope this helps!\n"
+    assert extract_cif(text) == ZNO_CIF.strip()
+
+
+def test_fences_in_other_languages_are_not_cifs():
+    text = "```python\ndata_frame = 1\n_cell_length_a = 3.2\n```\n"
+    assert extract_cifs(text) == []
+
+
+def test_data_block_without_structure_tags_is_not_a_cif():
+    assert extract_cifs("```\ndata_frame = 1\n```\n") == []
+
+
+def test_streaming_response_ignores_the_open_fence():
+    text = model_response([ZNO_CIF])
+    cut = text.index("```cif") + 40
+    assert closed_cif(text[:cut]) == ""
+    assert closed_cif(text) == ZNO_CIF.strip()
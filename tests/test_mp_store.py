@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pymatgen")
+
+from component import mp_store
+from component.mp_store import ReferenceStore
+
+
+def zno_doc():
+    return SimpleNamespace(
+        material_id="mp-2133", formula_pretty="ZnO", chemsys="O-Zn", density=5.6, symmetry=SimpleNamespace(symbol="P6_3mc"),
+        volume=48.0, energy_above_hull=0.0, formation_energy_per_atom=-1.8
+    )
+
+
+class FailingRester:
+    def __init__(self):
+        self.summary = self
+
+    def search(self, **kwargs):
+        raise ConnectionError("Materials Project unreachable")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(mp_store, "_get_rester", FailingRester)
+    # TTL 0: every stored system is stale, so each lookup tries to refresh it
+    return ReferenceStore(str(tmp_path / "mp_reference.sqlite"), ttl=0)
+
+
+def test_stale_entry_is_served_when_the_refresh_fails(store):
+    store.upsert([zno_doc()], ["O-Zn"])
+    assert store.get_reference("ZnO")["mp_id"] == "mp-2133"
+
+
+def test_refresh_error_is_raised_when_nothing_is_stored(store):
+    with pytest.raises(ConnectionError):
+        store.get_reference("ZnO")
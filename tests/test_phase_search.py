@@ -0,0 +1,36 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymatgen")
+pytest.importorskip("scipy")
+
+from pymatgen.core import Lattice, Structure
+
+from benchmarks.fixtures import ZNO_CIF
+from component.phase_search import build_index
+from component.xrd_engine import simulate_patterns
+
+
+@pytest.fixture(scope="module")
+def zno():
+    return Structure.from_str(ZNO_CIF, fmt="cif")
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory, zno):
+    nacl = Structure.from_spacegroup("Fm-3m", Lattice.cubic(5.64), ["Na", "Cl"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+    return build_index([("zno", zno), ("nacl", nacl)], str(tmp_path_factory.mktemp("phase_index")))
+
+
+def test_measured_peaks_rank_their_phase_first(index, zno):
+    two_theta, intensity = simulate_patterns([zno])[0]
+    assert index.query(two_theta, intensity, top_k=2)[0]["id"] == "zno"
+
+
+def test_no_peaks_give_no_candidates(index):
+    assert index.query([], []) == []
+
+
+def test_peaks_outside_every_pattern_give_no_candidates(index):
+    # Far outside the fingerprint grid, so no reference shares any intensity with it
+    assert index.query([150.0], [100.0]) == []
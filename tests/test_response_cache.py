@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from component.response_cache import ResponseCache
+
+CALLERS = 4
+
+
+def _wait_for_waiters(cache, count, timeout=5):
+    """Blocks until `count` callers are waiting on the leader's flight."""
+    deadline = time.monotonic() + timeout
+    while cache.stats["shared"] < count:
+        if time.monotonic() > deadline:
+            raise AssertionError(f"only {cache.stats['shared']} callers joined the flight")
+        time.sleep(0.01)
+
+
+def test_concurrent_identical_requests_share_one_call(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    calls = []
+    release = threading.Event()
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return SimpleNamespace(text="answer", usage_metadata=None)
+
+    with ThreadPoolExecutor(CALLERS) as pool:
+        futures = [pool.submit(cache.get_or_call, "key", "model", call) for _ in range(CALLERS)]
+        _wait_for_waiters(cache, CALLERS - 1)
+        release.set()
+        texts = [f.result().text for f in futures]
+
+    assert calls == [1]
+    assert texts == ["answer"] * CALLERS
+    assert cache.get("key").text == "answer"
+
+
+def test_concurrent_identical_streams_share_one_upstream_stream(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    calls = []
+    release = threading.Event()
+
+    def call():
+        calls.append(1)
+        for text in ("ZnO ", "is ", "wurtzite"):
+            release.wait(5)
+            yield SimpleNamespace(text=text, usage_metadata=None)
+
+    def read():
+        return "".join(chunk.text for chunk, _ in cache.stream_or_call("key", "model", call))
+
+    with ThreadPoolExecutor(CALLERS) as pool:
+        futures = [pool.submit(read) for _ in range(CALLERS)]
+        _wait_for_waiters(cache, CALLERS - 1)
+        release.set()
+        texts = [f.result() for f in futures]
+
+    assert calls == [1]
+    assert texts == ["ZnO is wurtzite"] * CALLERS
+    # A later caller is answered from the cache as one chunk
+    assert [source for _, source in cache.stream_or_call("key", "model", call)] == ["cache"]
+
+
+def test_abandoned_stream_fails_its_waiters_instead_of_hanging(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    first_chunk = threading.Event()
+
+    def call():
+        yield SimpleNamespace(text="partial", usage_metadata=None)
+        yield SimpleNamespace(text="never read", usage_metadata=None)
+
+    leader = cache.stream_or_call("key", "model", call)
+    next(leader)
+
+    def follow():
+        first_chunk.set()
+        return [chunk.text for chunk, _ in cache.stream_or_call("key", "model", call)]
+
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(follow)
+        first_chunk.wait(5)
+        _wait_for_waiters(cache, 1)
+        leader.close()
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    assert cache.get("key") is None
+
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["call", "stream"])
+def test_miss_racing_the_leaders_store_is_answered_from_the_cache(tmp_path, streaming):
+    cache = ResponseCache(path=str(tmp_path))
+    cache.put("key", "model", SimpleNamespace(text="answer", usage_metadata=None))
+    # The caller's first lookup ran just before the leader stored its answer (and closed its flight)
+    real_get = cache.get
+    lookups = []
+
+    def get(key):
+        lookups.append(key)
+        return real_get(key) if len(lookups) > 1 else None
+
+    cache.get = get
+
+    def call():
+        raise AssertionError("a second upstream call was made")
+
+    if streaming:
+        assert [(chunk.text, source) for chunk, source in cache.stream_or_call("key", "model", call)] == [("answer", "cache")]
+    else:
+        assert cache.get_or_call("key", "model", call).text == "answer"
+    assert cache.stats == {"hits": 1, "misses": 0, "shared": 0}
@@ -0,0 +1,86 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymatgen")
+
+from pymatgen.core import Structure
+from pymatgen.io.cif import CifWriter
+
+from benchmarks.fixtures import ZNO_CIF, perturbed_cifs, supercell_cif
+from component.physics_engine import analyze_structure
+from component.simulator import simulate_xrd_pattern
+from component import structure_index
+from component.structure_index import StructureIndex, canonical_cif
+
+
+def scaled_cif(linear):
+    """ZnO with every lattice length multiplied by `linear`."""
+    structure = Structure.from_str(ZNO_CIF, fmt="cif")
+    structure.scale_lattice(structure.volume * linear ** 3)
+    return str(CifWriter(structure)).replace("data_ZnO", f"data_ZnO_x{linear}", 1)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = StructureIndex(str(tmp_path / "structure_index.sqlite"))
+    # analyze_structure and simulate_xrd_pattern go through the process-wide index
+    monkeypatch.setattr(structure_index, "_index", index)
+    return index
+
+
+def test_displaced_copies_join_the_first_cluster(index):
+    first = index.resolve(ZNO_CIF)
+    assert first["new"]
+    for cif in perturbed_cifs(8, distance=0.02):
+        # The noise can drop the copy into a subgroup, which must not keep it from the matcher
+        match = index.resolve(cif)
+        assert not match["new"]
+        assert match["rep_id"] == first["rep_id"]
+    assert index.clusters()[0]["members"] == 9
+
+
+def test_displaced_copies_reuse_the_representative_results(index):
+    reference = analyze_structure(ZNO_CIF)
+    cif = perturbed_cifs(8, distance=0.02)[0]
+    assert canonical_cif(cif) == ZNO_CIF
+    assert analyze_structure(cif) == reference
+    assert simulate_xrd_pattern(cif)[0] is simulate_xrd_pattern(ZNO_CIF)[0]
+    assert index.stats["reused"] == 1
+
+
+def test_lattice_beyond_tolerance_starts_a_new_cluster(index):
+    first = index.resolve(ZNO_CIF)
+    # 30% longer axes: outside ltol (and two volume bins away)
+    assert index.resolve(scaled_cif(1.3))["rep_id"] != first["rep_id"]
+
+
+def test_supercell_cif_reuses_the_primitive_cell(index):
+    # CIFs are parsed to their primitive cell, so a supercell CIF has the same metrics as the cell itself
+    first = index.resolve(ZNO_CIF)
+    match = index.resolve(supercell_cif(2))
+    assert match["rep_id"] == first["rep_id"]
+    assert match["same_cell"]
+
+
+def test_same_text_resolves_from_memory(index):
+    index.resolve(ZNO_CIF)
+    lookups = index.stats["lookups"]
+    index.resolve(ZNO_CIF + "\n")
+    assert index.stats["lookups"] == lookups
+
+
+def test_cluster_members_keep_their_own_metrics_and_pattern(index):
+    compressed = scaled_cif(0.95)
+    # Within matcher tolerance, so both land in one cluster...
+    assert index.resolve(compressed)["rep_id"] == index.resolve(ZNO_CIF)["rep_id"]
+    assert canonical_cif(compressed) == compressed
+
+    # ...but analysis and simulation still use the compressed cell itself
+    reference = analyze_structure(ZNO_CIF)
+    metrics = analyze_structure(compressed)
+    assert metrics["a"] == pytest.approx(reference["a"] * 0.95, rel=1e-4)
+    assert metrics["density"] == pytest.approx(reference["density"] / 0.95 ** 3, rel=1e-4)
+
+    reference_peaks, _ = simulate_xrd_pattern(ZNO_CIF)
+    compressed_peaks, _ = simulate_xrd_pattern(compressed)
+    assert compressed_peaks[0] > reference_peaks[0] + 0.5
@@ -0,0 +1,31 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymatgen")
+
+from pymatgen.analysis.diffraction.xrd import XRDCalculator
+from pymatgen.core import Structure
+
+from benchmarks.fixtures import ZNO_CIF, supercell_cif
+from component.xrd_engine import simulate_patterns
+
+
+@pytest.mark.parametrize("cif", [ZNO_CIF, supercell_cif(2)], ids=["ZnO", "ZnO-2x2x2"])
+def test_patterns_match_pymatgen(cif):
+    structure = Structure.from_str(cif, fmt="cif")
+    expected = XRDCalculator(wavelength="CuKa").get_pattern(structure, scaled=True, two_theta_range=(0, 90))
+
+    two_theta, intensity = simulate_patterns([structure], wavelength="CuKa", two_theta_range=(0, 90))[0]
+
+    assert len(two_theta) == len(expected.x)
+    np.testing.assert_allclose(two_theta, expected.x, atol=1e-4)
+    np.testing.assert_allclose(intensity, expected.y, rtol=1e-3, atol=0.05)
+
+
+def test_batch_matches_single_structure_runs():
+    structures = [Structure.from_str(ZNO_CIF, fmt="cif"), Structure.from_str(supercell_cif(2), fmt="cif")]
+    batched = simulate_patterns(structures)
+    for structure, (two_theta, intensity) in zip(structures, batched):
+        single_theta, single_intensity = simulate_patterns([structure])[0]
+        np.testing.assert_allclose(two_theta, single_theta)
+        np.testing.assert_allclose(intensity, single_intensity)